@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import marshal
+import os
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from xml.sax import SAXParseException
+
+from aiml.AimlParser import create_parser
+
+logger = logging.getLogger(__name__)
+
+
+class BrainCache:
+    """AIML brain dump keyed by a manifest of source file content hashes.
+
+    The source files are the learn list itself plus every ``<learn>`` entry
+    in it, in order. Each source is compiled to a fragment (its parsed
+    categories) stored under its content hash. When any hash changes only
+    the affected fragments are re-parsed, then the brain is reassembled and
+    dumped again.
+
+    Every file is written to a temporary name and renamed into place, the
+    manifest last, so processes starting at the same time never read a
+    partial fragment or dump. One that is unreadable anyway is rebuilt.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, learn_list, brain_file, cache_dir):
+        """
+        Args:
+            learn_list: AIML file whose <learn> tags list the brain sources
+            brain_file: Path of the full brain dump
+            cache_dir: Directory for the manifest and compiled fragments
+        """
+        self.learn_list = learn_list
+        self.brain_file = brain_file
+        self.cache_dir = cache_dir
+        self.manifest_file = os.path.join(cache_dir, "manifest.json")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def sources(self):
+        """Return the source files in learn order"""
+        root = ET.parse(self.learn_list).getroot()
+        learned = [element.text.strip() for element in root.iter("learn") if element.text]
+        return [self.learn_list] + learned
+
+    def _hash(self, path):
+        if not os.path.exists(path):
+            return None
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _fragment_path(self, source, digest):
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", os.path.normpath(source))
+        return os.path.join(self.cache_dir, f"{name}.{digest[:16]}.fragment")
+
+    @staticmethod
+    def _replace(path, write):
+        """Write path through a temporary file renamed over it"""
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, kernel):
+        """Load the brain into kernel, rebuilding it if any source changed.
+
+        Returns:
+            Dictionary with 'status' ('hit' or 'miss'), 'seconds',
+            'categories' and 'compiled' (sources re-parsed on a miss)
+        """
+        start = time.time()
+        files = [[source, self._hash(source)] for source in self.sources()]
+        manifest = self._read_manifest()
+
+        if (manifest and manifest.get('version') == self.FORMAT_VERSION
+                and manifest.get('files') == files and os.path.exists(self.brain_file)):
+            try:
+                kernel.loadBrain(self.brain_file)
+                return self._report('hit', start, kernel, [])
+            except (EOFError, ValueError, TypeError) as e:
+                logger.warning(f"Brain dump {self.brain_file} is unreadable, rebuilding: {e}")
+
+        categories, compiled = self._assemble(files)
+        if kernel.numCategories():
+            kernel.resetBrain()
+        for key, template in categories.items():
+            kernel._brain.add(key, template)
+        self._replace(self.brain_file, kernel.saveBrain)
+
+        def write_manifest(path):
+            with open(path, 'w') as f:
+                json.dump({'version': self.FORMAT_VERSION, 'files': files}, f, indent=2)
+        self._replace(self.manifest_file, write_manifest)
+        self._remove_stale_fragments(files)
+        return self._report('miss', start, kernel, compiled)
+
+    def categories(self):
+        """Return the merged categories of the current sources.
+
+        Fragments are read from the cache and only missing ones are parsed.
+        """
+        files = [[source, self._hash(source)] for source in self.sources()]
+        return self._assemble(files)[0]
+
+    def _assemble(self, files):
+        """Merge fragments in learn order; later files override earlier ones"""
+        categories = {}
+        compiled = []
+        for source, digest in files:
+            if digest is None:
+                logger.warning(f"AIML source {source} not found, skipping")
+                continue
+            fragment_path = self._fragment_path(source, digest)
+            fragment = self._read_fragment(fragment_path)
+            if fragment is None:
+                try:
+                    fragment = self._compile(source)
+                except SAXParseException as e:
+                    logger.error(f"Failed to parse AIML source {source}: {e}")
+                    continue
+
+                def write_fragment(path):
+                    with open(path, 'wb') as f:
+                        marshal.dump(fragment, f)
+                self._replace(fragment_path, write_fragment)
+                compiled.append(source)
+            for key, template in fragment:
+                categories[tuple(key)] = template
+        return categories, compiled
+
+    def _read_fragment(self, path):
+        """Return the cached fragment, or None if it is missing or unreadable"""
+        try:
+            with open(path, 'rb') as f:
+                return marshal.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.warning(f"Fragment {path} is unreadable, recompiling: {e}")
+            return None
+
+    def _compile(self, source):
+        """Parse one AIML file into a list of (key, template) pairs"""
+        parser = create_parser()
+        handler = parser.getContentHandler()
+        handler.setEncoding("utf-8")
+        parser.parse(source)
+        return list(handler.categories.items())
+
+    def _remove_stale_fragments(self, files):
+        current = {os.path.basename(self._fragment_path(source, digest))
+                   for source, digest in files if digest}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".fragment") and name not in current:
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def _report(self, status, start, kernel, compiled):
+        return {
+            'status': status,
+            'seconds': time.time() - start,
+            'categories': kernel.numCategories(),
+            'compiled': compiled
+        }
@@ -0,0 +1,135 @@
+import bisect
+import re
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class CommandMetrics:
+    """Call count, error count and latency histogram of one command"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        # One count per bucket plus an overflow bucket
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, elapsed_ms, failed=False):
+        self.calls += 1
+        self.errors += failed
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def as_dict(self):
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'avg_ms': self.total_ms / self.calls if self.calls else 0.0,
+            'max_ms': self.max_ms,
+            'histogram': dict(zip(labels, self.histogram))
+        }
+
+
+class CommandRouter:
+    """Dispatches chat commands to registered handlers.
+
+    Prefix commands ("STORE GREETING ...") are matched case-insensitively by
+    one compiled alternation, so routing costs a single regex match however
+    many commands are registered. Pattern commands are regular expressions
+    searched anywhere in the query and take precedence over prefixes.
+    Modules add their commands through a register(router, ...) function.
+    """
+
+    def __init__(self):
+        self.prefixes = {}
+        self.patterns = []
+        self.metrics = {}
+        self._pattern = None
+        self._lock = threading.Lock()
+
+    def prefix(self, phrase, name=None):
+        """Decorator registering handler(user_id, query, rest) for queries
+        starting with phrase; rest is the query after the phrase"""
+        def decorator(handler):
+            key = " ".join(phrase.upper().split())
+            self.prefixes[key] = (name or key.lower().replace(" ", "_"), handler)
+            self._pattern = None
+            return handler
+        return decorator
+
+    def pattern(self, regex, name):
+        """Decorator registering handler(user_id, query, match) for queries
+        matching regex anywhere"""
+        def decorator(handler):
+            compiled = re.compile(regex, re.IGNORECASE) if isinstance(regex, str) else regex
+            self.patterns.append((name, compiled, handler))
+            return handler
+        return decorator
+
+    def _compile(self):
+        # Longest phrases first so "SHOW GREETINGS" wins over a shorter "SHOW"
+        alternation = "|".join(
+            r"\s+".join(map(re.escape, phrase.split()))
+            for phrase in sorted(self.prefixes, key=len, reverse=True)
+        )
+        return re.compile(rf"^\s*(?P<phrase>{alternation})\b\s*(?P<rest>.*)$", re.IGNORECASE | re.DOTALL)
+
+    def match(self, query):
+        """Find the command for a query.
+
+        Returns:
+            Tuple (name, handler, argument) where argument is the pattern
+            match or the rest of the query, or None
+        """
+        for name, regex, handler in self.patterns:
+            match = regex.search(query)
+            if match:
+                return name, handler, match
+
+        if not self.prefixes:
+            return None
+        if self._pattern is None:
+            self._pattern = self._compile()
+        match = self._pattern.match(query)
+        if not match:
+            return None
+        name, handler = self.prefixes[" ".join(match.group("phrase").upper().split())]
+        return name, handler, match.group("rest").strip()
+
+    def dispatch(self, user_id, query):
+        """Run the command matching query and record its latency.
+
+        Returns:
+            The handler's response, or None if no command matches
+        """
+        found = self.match(query)
+        if found is None:
+            return None
+        name, handler, argument = found
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = handler(user_id, query, argument)
+            failed = False
+            return response
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000, failed)
+
+    def record(self, name, elapsed_ms, failed=False):
+        """Record a call of name, e.g. "aiml" for queries no command handles"""
+        with self._lock:
+            metrics = self.metrics.get(name)
+            if metrics is None:
+                metrics = self.metrics[name] = CommandMetrics()
+            metrics.record(elapsed_ms, failed)
+
+    def stats(self):
+        """Per-command call counts and latency histograms"""
+        with self._lock:
+            return {name: metrics.as_dict() for name, metrics in sorted(self.metrics.items())}
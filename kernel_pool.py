@@ -0,0 +1,279 @@
+import gc
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from multiprocessing import reduction
+from multiprocessing.connection import Connection
+
+logger = logging.getLogger(__name__)
+
+# The kernel's shared session, which is never evicted
+GLOBAL_SESSION = "_global"
+
+
+class SessionTable:
+    """Least recently used AIML sessions with an idle timeout.
+
+    Every guest gets its own AIML session holding predicates and input
+    history. The table tells which sessions to delete from the kernel once
+    there are more than max_sessions or one has been idle for ttl seconds.
+    """
+
+    def __init__(self, max_sessions=10000, ttl=3600):
+        """
+        Args:
+            max_sessions: Most sessions to keep
+            ttl: Seconds a session may stay idle, 0 to keep idle sessions
+        """
+        self.max_sessions = max(1, max_sessions)
+        self.ttl = ttl
+        self.evicted = 0
+        self._last_used = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._last_used)
+
+    def touch(self, session_id, now=None):
+        """Mark session_id as used.
+
+        Returns:
+            List of session IDs to delete, least recently used first
+        """
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._lock:
+            self._last_used[session_id] = now
+            self._last_used.move_to_end(session_id)
+            while len(self._last_used) > 1:
+                oldest, last_used = next(iter(self._last_used.items()))
+                if len(self._last_used) <= self.max_sessions and (
+                        not self.ttl or now - last_used <= self.ttl):
+                    break
+                del self._last_used[oldest]
+                expired.append(oldest)
+            self.evicted += len(expired)
+        return expired
+
+
+def respond_in_session(kernel, text, session_id, predicates=None, cache=None, sessions=None):
+    """Set session predicates and answer text in the given AIML session.
+
+    With a SessionTable, the sessions it evicts are deleted from the kernel.
+    """
+    if sessions is not None and session_id != GLOBAL_SESSION:
+        # python-aiml 0.9.3 only has the private name
+        delete_session = getattr(kernel, "deleteSession", None) or kernel._deleteSession
+        for expired in sessions.touch(session_id):
+            delete_session(expired)
+    for name, value in (predicates or {}).items():
+        kernel.setPredicate(name, value, session_id)
+    if cache is not None:
+        return cache.respond(kernel, text, session_id)
+    return kernel.respond(text, session_id)
+
+
+def _worker_loop(kernel, cache, sessions, conn):
+    """Serve respond requests until the parent sends None or goes away"""
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+        try:
+            conn.send((True, respond_in_session(kernel, *request, cache=cache, sessions=sessions)))
+        except Exception as e:
+            conn.send((False, repr(e)))
+    conn.close()
+
+
+def _zygote_loop(kernel, cache, sessions, control):
+    """Fork a worker for every pipe end the parent sends.
+
+    The zygote never starts a thread, so no lock can be held by another
+    thread when it forks, however many threads the serving parent runs.
+    """
+    # Workers are children of the zygote; let the kernel reap them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    # Keep the collector off the brain so workers do not copy its pages
+    gc.freeze()
+    while True:
+        try:
+            request = control.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+        fd = reduction.recv_handle(control)
+        try:
+            pid = os.fork()
+        except OSError as e:
+            os.close(fd)
+            control.send(repr(e))
+            continue
+        if pid == 0:
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            control.close()
+            code = 0
+            try:
+                _worker_loop(kernel, cache, sessions, Connection(fd))
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(fd)
+        control.send(pid)
+    control.close()
+
+
+class KernelPool:
+    """Forked AIML kernel workers sharing the parent's brain copy-on-write.
+
+    The brain is loaded once in the parent, which then forks a zygote
+    process. The zygote forks every worker, so the brain's pages stay shared
+    until written. Every session is pinned to one worker, which keeps that
+    user's AIML predicates consistent. A worker that died is forked again by
+    the zygote on its next request; the serving parent itself never forks
+    again once it runs threads.
+    """
+
+    def __init__(self, kernel, workers, cache=None, sessions=None):
+        """Fork the zygote and the worker processes.
+
+        Args:
+            kernel: aiml.Kernel with its brain already loaded
+            workers: Number of worker processes
+            cache: Optional ResponseCache; each worker gets its own copy
+            sessions: Optional SessionTable; each worker gets its own copy
+                and evicts idle sessions from its kernel
+
+        Raises:
+            ValueError: If the platform does not support fork
+        """
+        self._context = multiprocessing.get_context("fork")
+        self.restarts = 0
+
+        gc.collect()
+        self._control, zygote_control = self._context.Pipe()
+        self._zygote = self._context.Process(
+            target=_zygote_loop,
+            args=(kernel, cache, sessions, zygote_control),
+            name="aiml-zygote",
+            daemon=True
+        )
+        self._zygote.start()
+        zygote_control.close()
+        self._zygote_lock = threading.Lock()
+
+        self._workers = []
+        try:
+            for index in range(workers):
+                self._workers.append((*self._start(index), threading.Lock()))
+        except OSError:
+            self.close()
+            raise
+        logger.info(f"Started {workers} AIML kernel workers")
+
+    def _start(self, index):
+        """Have the zygote fork worker index.
+
+        Returns:
+            (name, parent_conn) tuple
+
+        Raises:
+            OSError: If the zygote is gone or could not fork
+        """
+        parent_conn, child_conn = self._context.Pipe()
+        try:
+            with self._zygote_lock:
+                try:
+                    self._control.send(True)
+                    reduction.send_handle(self._control, child_conn.fileno(), self._zygote.pid)
+                    pid = self._control.recv()
+                except EOFError:
+                    raise OSError("AIML zygote process is not running")
+        except OSError:
+            parent_conn.close()
+            raise
+        finally:
+            child_conn.close()
+        if not isinstance(pid, int):
+            parent_conn.close()
+            raise OSError(f"AIML zygote failed to fork: {pid}")
+        name = f"aiml-worker-{index}"
+        logger.debug(f"{name} started (pid {pid})")
+        return name, parent_conn
+
+    def _restart(self, index):
+        """Replace dead worker index; call with its lock held"""
+        name, conn, lock = self._workers[index]
+        conn.close()
+        logger.warning(f"AIML worker {name} died, restarting")
+        self._workers[index] = (*self._start(index), lock)
+        self.restarts += 1
+        return self._workers[index]
+
+    def __len__(self):
+        return len(self._workers)
+
+    def _index_for(self, session_id):
+        """Stable session-to-worker routing"""
+        return zlib.crc32(str(session_id).encode("utf-8")) % len(self._workers)
+
+    def respond(self, text, session_id, predicates=None):
+        """Answer text on the worker that owns session_id.
+
+        A worker found dead is restarted before the request is sent. One that
+        dies while answering is restarted for the next request.
+
+        Raises:
+            RuntimeError: If the worker failed, died or could not be restarted
+        """
+        index = self._index_for(session_id)
+        name, conn, lock = self._workers[index]
+        with lock:
+            try:
+                # An idle worker never writes, so a readable pipe means EOF
+                if conn.closed or conn.poll():
+                    name, conn, _ = self._restart(index)
+                conn.send((text, session_id, predicates))
+            except (EOFError, OSError) as e:
+                raise RuntimeError(f"AIML worker {name} is not available: {e}")
+            try:
+                ok, result = conn.recv()
+            except (EOFError, OSError) as e:
+                try:
+                    self._restart(index)
+                except OSError as restart_error:
+                    logger.error(f"Failed to restart AIML worker {name}: {restart_error}")
+                raise RuntimeError(f"AIML worker {name} died while answering: {e}")
+        if not ok:
+            raise RuntimeError(f"AIML worker {name} failed: {result}")
+        return result
+
+    def close(self):
+        """Stop all workers and the zygote"""
+        for _, conn, lock in self._workers:
+            with lock:
+                try:
+                    conn.send(None)
+                except (EOFError, OSError):
+                    pass
+                conn.close()
+        with self._zygote_lock:
+            try:
+                self._control.send(None)
+            except (EOFError, OSError):
+                pass
+            self._control.close()
+        self._zygote.join(timeout=5)
+        if self._zygote.is_alive():
+            self._zygote.terminate()
+        logger.info("AIML kernel workers stopped")
@@ -0,0 +1,86 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class KinshipIndex:
+    """Materialized answers of every binary relation in a Prolog knowledge base.
+
+    For each relation ``r`` defined in the consulted file, all solutions of
+    ``r(X, Y)`` are enumerated once and stored as ``r -> Y -> [X, ...]``,
+    which answers the ``r(X, person)`` goals asked by the chatbot directly.
+    """
+
+    def __init__(self):
+        self.relations = {}
+        self.predicates = []
+
+    def rebuild(self, query, source_file, query_batch=None):
+        """Enumerate the relations defined in source_file.
+
+        Args:
+            query: Callable taking a goal string and returning a list of
+                solution dictionaries
+            source_file: Absolute path of the consulted .pl file, as used in
+                the consult goal
+            query_batch: Optional callable running a list of goals in one
+                round trip, as PrologService.query_batch does
+        """
+        start = time.time()
+        try:
+            solutions = query(f"source_file(H, '{source_file}'), functor(H, Name, 2)")
+        except Exception as e:
+            logger.error(f"Failed to list Prolog predicates: {e}")
+            solutions = []
+        predicates = list(dict.fromkeys(str(solution['Name']) for solution in solutions))
+
+        relations = {}
+        if query_batch:
+            results = query_batch([f"{name}(X, Y)" for name in predicates])
+            for name, result in zip(predicates, results):
+                if not result['ok']:
+                    logger.warning(f"Relation {name} not materialized: {result['error']}")
+                    continue
+                answers = self._collect(result['solutions'])
+                if answers is not None:
+                    relations[name] = answers
+        else:
+            for name in predicates:
+                try:
+                    answers = self._collect(query(f"{name}(X, Y)"))
+                except Exception as e:
+                    logger.warning(f"Relation {name} not materialized: {e}")
+                    continue
+                if answers is not None:
+                    relations[name] = answers
+
+        self.predicates = predicates
+        self.relations = relations
+        logger.info(f"Kinship index built with {len(relations)} of {len(predicates)} "
+                    f"relations in {time.time() - start:.2f}s")
+
+    def _collect(self, solutions):
+        """Return person -> answers for one relation, or None if it is not
+        purely a relation between atoms (e.g. count_children/2)"""
+        answers = {}
+        for solution in solutions:
+            x, y = solution.get('X'), solution.get('Y')
+            if not isinstance(x, str) or not isinstance(y, str):
+                return None
+            people = answers.setdefault(y, [])
+            if x not in people:
+                people.append(x)
+        return answers
+
+    def lookup(self, relation, person):
+        """Look up the answers of relation(X, person).
+
+        Returns:
+            Tuple (materialized, answers); answers is only meaningful when
+            the relation is materialized
+        """
+        answers = self.relations.get(relation)
+        if answers is None:
+            return False, []
+        return True, answers.get(person, [])
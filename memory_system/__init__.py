@@ -4,6 +4,11 @@ from .pam_memory import PAMMemory
 from .semantic_memory import SemanticMemory
 from .social_memory import SocialMemory
 from .episodic_memory import EpisodicMemory  # New import
+from .user_log import UserLog
+from .nlp_service import NLPService
+from .kinship_graph import KinshipGraph
+from .connection import Neo4jConnection
+from .migrations import SchemaMigrator
 from dotenv import load_dotenv
 import os
 import logging
@@ -23,24 +28,24 @@ class MemorySystem:
         if not all([self.uri, self.user, self.password]):
             raise ValueError("Missing Neo4j credentials. Provide via .env or constructor")
 
+        # One shared connection, owned (and closed) by the MemorySystem
+        self.db = Neo4jConnection.connect(self.uri, self.user, self.password)
         try:
+            SchemaMigrator(self.db).migrate()
             # Initialize all memory subsystems
-            self.sensory = SensoryMemory(self.uri, self.user, self.password)
-            self.motor = MotorMemory(self.uri, self.user, self.password)
-            self.pam = PAMMemory(self.uri, self.user, self.password)
-            self.semantic = SemanticMemory(self.uri, self.user, self.password)
-            self.social = SocialMemory(self.uri, self.user, self.password)
-            self.episodic = EpisodicMemory(self.uri, self.user, self.password)  # New memory system
+            self.sensory = SensoryMemory(self.db)
+            self.motor = MotorMemory(self.db)
+            self.pam = PAMMemory(self.db)
+            self.semantic = SemanticMemory(self.db)
+            self.social = SocialMemory(self.db)
+            self.episodic = EpisodicMemory(self.db)  # New memory system
             logger.info("All memory systems initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing memory systems: {e}")
+            self.db.close()
             raise
 
     def close(self):
-        """Close all Neo4j connections"""
-        self.sensory.driver.close()
-        self.motor.driver.close()
-        self.pam.driver.close()
-        self.semantic.driver.close()
-        self.social.driver.close()
-        self.episodic.driver.close()  # Close episodic memory connection
\ No newline at end of file
+        """Flush pending sensory consolidation and close the shared Neo4j connection"""
+        self.sensory.close()
+        self.db.close()
\ No newline at end of file
@@ -0,0 +1,176 @@
+from neo4j import GraphDatabase, READ_ACCESS, WRITE_ACCESS
+from neo4j.exceptions import DriverError, Neo4jError
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Neo4jConnection:
+    """Shared Neo4j driver with managed, retried transactions.
+
+    One connection is created by the application and handed to every memory
+    class. Work runs in execute_read/execute_write managed transactions that
+    are retried a bounded number of times on transient errors, and the
+    connection keeps counters for pool utilization. Only the owner closes it.
+    """
+
+    def __init__(self, driver, max_pool_size=100, max_retries=3, retry_delay=0.1, database=None):
+        """Wrap an existing driver.
+
+        Args:
+            driver: Neo4j driver instance (GraphDatabase.driver)
+            max_pool_size: The driver's max_connection_pool_size, for stats
+            max_retries: Retries of a transaction after a transient error
+            retry_delay: Initial retry back-off in seconds, doubled per retry
+            database: Database name, or None for the server default
+        """
+        if not hasattr(driver, 'session'):
+            raise ValueError("Driver must be a Neo4j GraphDatabase driver instance")
+
+        self.driver = driver
+        self.max_pool_size = max_pool_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.database = database
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._counts = {'reads': 0, 'writes': 0, 'retries': 0, 'failures': 0}
+
+    @classmethod
+    def connect(cls, uri, user, password, max_pool_size=100, acquisition_timeout=60.0, **kwargs):
+        """Create a driver with the given pool settings and wrap it.
+
+        Args:
+            uri: Bolt URI of the server
+            user: Neo4j user name
+            password: Neo4j password
+            max_pool_size: Maximum number of pooled connections
+            acquisition_timeout: Seconds to wait for a free pooled connection
+            **kwargs: Passed on to Neo4jConnection
+        """
+        driver = GraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            max_connection_pool_size=max_pool_size,
+            connection_acquisition_timeout=acquisition_timeout,
+            # Retries are bounded by max_retries here, not by time in the driver
+            max_transaction_retry_time=0
+        )
+        return cls(driver, max_pool_size=max_pool_size, **kwargs)
+
+    @classmethod
+    def from_env(cls):
+        """Connect using NEO4J_* environment variables"""
+        return cls.connect(
+            os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+            os.getenv("NEO4J_USER", "neo4j"),
+            os.getenv("NEO4J_PASS", "admin@123"),
+            max_pool_size=int(os.getenv("NEO4J_POOL_SIZE", 100)),
+            acquisition_timeout=float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", 60.0)),
+            max_retries=int(os.getenv("NEO4J_MAX_RETRIES", 3)),
+            database=os.getenv("NEO4J_DATABASE") or None
+        )
+
+    @classmethod
+    def wrap(cls, connection):
+        """Return connection itself, or a Neo4jConnection around a raw driver"""
+        return connection if isinstance(connection, cls) else cls(connection)
+
+    def execute_read(self, work, *args, **kwargs):
+        """Run work(tx, *args, **kwargs) in a read transaction"""
+        return self._execute(READ_ACCESS, work, args, kwargs)
+
+    def execute_write(self, work, *args, **kwargs):
+        """Run work(tx, *args, **kwargs) in a write transaction"""
+        return self._execute(WRITE_ACCESS, work, args, kwargs)
+
+    def read(self, query, **params):
+        """Run one read query and return its records"""
+        return self.execute_read(self._run, query, params)
+
+    def write(self, query, **params):
+        """Run one write query and return its records"""
+        return self.execute_write(self._run, query, params)
+
+    def write_autocommit(self, query, **params):
+        """Run one write query in an auto-commit transaction.
+
+        Needed for CALL { ... } IN TRANSACTIONS, which commits its own
+        batches; the query is not retried.
+        """
+        self._acquire()
+        try:
+            with self.driver.session(database=self.database, default_access_mode=WRITE_ACCESS) as session:
+                session.run(query, params).consume()
+            with self._lock:
+                self._counts['writes'] += 1
+        except (Neo4jError, DriverError):
+            with self._lock:
+                self._counts['failures'] += 1
+            raise
+        finally:
+            self._release()
+
+    @staticmethod
+    def _run(tx, query, params):
+        return list(tx.run(query, params))
+
+    def _execute(self, access_mode, work, args, kwargs):
+        counter = 'reads' if access_mode == READ_ACCESS else 'writes'
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                with self.driver.session(database=self.database, default_access_mode=access_mode) as session:
+                    if access_mode == READ_ACCESS:
+                        result = session.execute_read(work, *args, **kwargs)
+                    else:
+                        result = session.execute_write(work, *args, **kwargs)
+                with self._lock:
+                    self._counts[counter] += 1
+                return result
+            except (Neo4jError, DriverError) as e:
+                if not e.is_retryable() or attempt >= self.max_retries:
+                    with self._lock:
+                        self._counts['failures'] += 1
+                    raise
+                delay = self.retry_delay * (2 ** attempt)
+                attempt += 1
+                with self._lock:
+                    self._counts['retries'] += 1
+                logger.warning(f"Transient Neo4j error, retry {attempt}/{self.max_retries} in {delay:.2f}s: {e}")
+            finally:
+                self._release()
+            time.sleep(delay)
+
+    def _acquire(self):
+        with self._lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+    def _release(self):
+        with self._lock:
+            self._in_use -= 1
+
+    def stats(self):
+        """Transaction counters and pool utilization"""
+        with self._lock:
+            return {
+                **self._counts,
+                'in_use': self._in_use,
+                'peak_in_use': self._peak_in_use,
+                'max_pool_size': self.max_pool_size,
+                'utilization': self._in_use / self.max_pool_size if self.max_pool_size else None
+            }
+
+    def verify(self):
+        """Check the server is reachable"""
+        return self.read("RETURN 1 AS test")[0]['test'] == 1
+
+    def close(self):
+        self.driver.close()
+        logger.info(f"Neo4j driver closed: {self.stats()}")
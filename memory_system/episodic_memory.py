@@ -1,122 +1,234 @@
 from datetime import datetime
-import spacy
 import uuid
 import logging
 import json
-from neo4j import GraphDatabase
+import re
+import threading
+from collections import OrderedDict, defaultdict, deque
+from .connection import Neo4jConnection
+from .nlp_service import NLPService
 
-# Load NLP model
-nlp = spacy.load("en_core_web_sm")
 logger = logging.getLogger(__name__)
 
+# Characters with a meaning in Lucene query syntax
+LUCENE_SPECIAL = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
 
-class EpisodicMemory:
-    def __init__(self, driver):
-        """Initialize the episodic memory with existing Neo4j driver
 
+class RecentEpisodeCache:
+    """Per-user ring buffers of the most recent episodes with LRU eviction"""
+
+    def __init__(self, per_user=20, max_episodes=20000):
+        """
         Args:
-            driver: Neo4j driver instance (GraphDatabase.driver)
+            per_user: Number of recent episodes kept for each user
+            max_episodes: Cap on episodes held across all users
         """
-        if not hasattr(driver, 'session'):
-            raise ValueError("Driver must be a Neo4j GraphDatabase driver instance")
+        self.per_user = per_user
+        self.max_episodes = max_episodes
+        self._buffers = OrderedDict()
+        self._size = 0
+        self._writes = defaultdict(int)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
 
-        self.driver = driver
-        self._initialize_schema()
-        logger.info("EpisodicMemory initialized successfully")
+    def get(self, user_id, limit):
+        """Return up to limit episodes newest first, or None on a miss"""
+        with self._lock:
+            buffer = self._buffers.get(user_id)
+            # A buffer that is not full holds the user's whole history
+            if buffer is None or (limit > self.per_user and len(buffer) == self.per_user):
+                self.misses += 1
+                return None
+            self._buffers.move_to_end(user_id)
+            self.hits += 1
+            return [dict(episode) for episode in reversed(buffer)][:limit]
 
-    def _initialize_schema(self):
-        """Create necessary database constraints and indexes"""
-        try:
-            with self.driver.session() as session:
-                session.run("""
-                    CREATE CONSTRAINT IF NOT EXISTS 
-                    FOR (e:Episode) REQUIRE e.id IS UNIQUE
-                """)
-                session.run("""
-                    CREATE INDEX IF NOT EXISTS 
-                    FOR (e:Episode) ON (e.timestamp)
-                """)
-                session.run("""
-                    CREATE INDEX IF NOT EXISTS 
-                    FOR (w:MemoryWord) ON (w.text)
-                """)
-            logger.debug("EpisodicMemory schema initialized")
-        except Exception as e:
-            logger.error(f"Schema initialization failed: {e}")
-            raise
+    def write_token(self, user_id):
+        """Mark the start of a database read of user_id's episodes"""
+        with self._lock:
+            return self._writes[user_id]
+
+    def hydrate(self, user_id, episodes, token):
+        """Load a user's buffer from episodes fetched newest first.
+
+        The result is dropped if an episode of the user was appended since
+        token was taken, because the fetched rows may then be missing it.
+        """
+        with self._lock:
+            if token != self._writes[user_id]:
+                return
+            self._drop(user_id)
+            buffer = deque(reversed(episodes[:self.per_user]), maxlen=self.per_user)
+            self._buffers[user_id] = buffer
+            self._size += len(buffer)
+            self._evict()
+
+    def append(self, user_id, episode):
+        """Write-through of a newly recorded episode"""
+        with self._lock:
+            self._writes[user_id] += 1
+            buffer = self._buffers.get(user_id)
+            if buffer is None:
+                return
+            if len(buffer) < buffer.maxlen:
+                self._size += 1
+            buffer.append(episode)
+            self._buffers.move_to_end(user_id)
+            self._evict()
+
+    def _drop(self, user_id):
+        buffer = self._buffers.pop(user_id, None)
+        if buffer is not None:
+            self._size -= len(buffer)
+
+    def _evict(self):
+        while self._size > self.max_episodes and len(self._buffers) > 1:
+            _, buffer = self._buffers.popitem(last=False)
+            self._size -= len(buffer)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._buffers),
+                'episodes': self._size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class EpisodicMemory:
+    def __init__(self, connection, nlp_service=None, recent_per_user=20, recent_max_episodes=20000):
+        """Initialize the episodic memory with the shared Neo4j connection
+
+        Args:
+            connection: Neo4jConnection, or a Neo4j driver to wrap in one
+            nlp_service: Optional shared NLPService, defaults to the
+                process-wide instance
+            recent_per_user: Recent episodes buffered in process per user
+            recent_max_episodes: Cap on buffered episodes across all users
+        """
+        self.db = Neo4jConnection.wrap(connection)
+        self.nlp = nlp_service or NLPService.shared()
+        self.recent = RecentEpisodeCache(recent_per_user, recent_max_episodes)
+        logger.info("EpisodicMemory initialized successfully")
 
     def record_interaction(self, user_id, utterance, role, sentiment=None, timestamp=None):
         """Store a conversation episode with sentiment analysis
 
+        The episode, its sentiment properties and all keyword links are
+        written in a single parameterized transaction.
+
         Args:
             user_id: ID of the user
             utterance: The text content
             role: 'user' or 'bot'
             sentiment: Optional sentiment data (as JSON string or None)
             timestamp: Optional custom timestamp
+
+        Returns:
+            ID of the stored episode
         """
+        episode_ids = self.record_interactions([{
+            'user_id': user_id,
+            'utterance': utterance,
+            'role': role,
+            'sentiment': sentiment,
+            'timestamp': timestamp
+        }])
+        return episode_ids[0]
+
+    def record_interactions(self, interactions):
+        """Store many conversation episodes in one commit
+
+        Args:
+            interactions: List of dictionaries with the keyword arguments of
+                record_interaction (user_id, utterance, role and optionally
+                sentiment and timestamp)
+
+        Returns:
+            List of episode IDs in the same order as the input
+        """
+        if not interactions:
+            return []
+
         try:
-            # Prepare sentiment properties
-            sentiment_props = {}
-            if sentiment:
-                try:
-                    # If sentiment is a string, parse it
-                    if isinstance(sentiment, str):
-                        sentiment_data = json.loads(sentiment)
-                    else:
-                        sentiment_data = sentiment
-
-                    sentiment_props = {
-                        'sentiment_polarity': float(sentiment_data.get('polarity', 0)),
-                        'sentiment_subjectivity': float(sentiment_data.get('subjectivity', 0)),
-                        'sentiment_label': str(sentiment_data.get('label', 'neutral'))
-                    }
-                except Exception as e:
-                    logger.error(f"Failed to process sentiment data: {e}")
-
-            with self.driver.session() as session:
-                # Store the main episode with sentiment properties
-                result = session.run("""
-                    MERGE (u:User {id: $user_id})
-                    CREATE (e:Episode {
-                        id: $id,
-                        text: $text,
-                        role: $role,
-                        timestamp: $timestamp
-                    })
-                    SET e += $sentiment_props
-                    MERGE (u)-[:HAS_EPISODE]->(e)
-                    RETURN id(e)
-                """,
-                                     user_id=user_id,
-                                     id=str(uuid.uuid4()),
-                                     text=utterance,
-                                     role=role,
-                                     timestamp=timestamp or datetime.now().isoformat(),
-                                     sentiment_props=sentiment_props)
-
-                episode_id = result.single()[0]
-
-                # Tokenize and store important words
-                doc = nlp(utterance)
-                for token in doc:
-                    if not token.is_stop and token.pos_ in ("NOUN", "PROPN", "VERB"):
-                        session.run("""
-                            MATCH (e:Episode) WHERE id(e) = $episode_id
-                            MERGE (w:MemoryWord {text: $word})
-                            MERGE (e)-[:CONTAINS_WORD]->(w)
-                        """,
-                                    episode_id=episode_id,
-                                    word=token.lemma_.lower())
-
-                logger.debug(f"Recorded interaction for user {user_id}")
+            episodes = [self._prepare_episode(**interaction) for interaction in interactions]
+
+            self.db.execute_write(self._write_episodes, episodes)
+
+            for episode in episodes:
+                self.recent.append(episode['user_id'], {
+                    'message': episode['text'],
+                    'role': episode['role'],
+                    'timestamp': episode['timestamp']
+                })
+
+            logger.debug(f"Recorded {len(episodes)} interactions")
+            return [episode['id'] for episode in episodes]
         except Exception as e:
-            logger.error(f"Failed to record interaction: {e}")
+            logger.error(f"Failed to record interactions: {e}")
             raise
 
+    @staticmethod
+    def _write_episodes(tx, episodes):
+        """Write prepared episodes and their keyword links in one statement"""
+        tx.run("""
+            UNWIND $episodes AS ep
+            MERGE (u:User {id: ep.user_id})
+            CREATE (e:Episode {
+                id: ep.id,
+                user_id: ep.user_id,
+                text: ep.text,
+                role: ep.role,
+                timestamp: ep.timestamp
+            })
+            SET e += ep.sentiment_props
+            MERGE (u)-[:HAS_EPISODE]->(e)
+            FOREACH (word IN ep.words |
+                MERGE (w:MemoryWord {text: word})
+                MERGE (e)-[:CONTAINS_WORD]->(w)
+            )
+        """, episodes=episodes).consume()
+
+    def _prepare_episode(self, user_id, utterance, role, sentiment=None, timestamp=None):
+        """Build the statement parameters for a single episode"""
+        return {
+            'user_id': user_id,
+            'id': str(uuid.uuid4()),
+            'text': utterance,
+            'role': role,
+            'timestamp': timestamp or datetime.now().isoformat(),
+            'sentiment_props': self._sentiment_props(sentiment),
+            'words': self._extract_keywords(utterance)
+        }
+
+    def _sentiment_props(self, sentiment):
+        """Convert sentiment data to episode properties"""
+        if not sentiment:
+            return {}
+        try:
+            # If sentiment is a string, parse it
+            if isinstance(sentiment, str):
+                sentiment_data = json.loads(sentiment)
+            else:
+                sentiment_data = sentiment
+
+            return {
+                'sentiment_polarity': float(sentiment_data.get('polarity', 0)),
+                'sentiment_subjectivity': float(sentiment_data.get('subjectivity', 0)),
+                'sentiment_label': str(sentiment_data.get('label', 'neutral'))
+            }
+        except Exception as e:
+            logger.error(f"Failed to process sentiment data: {e}")
+            return {}
+
     def recall_recent(self, user_id, limit=5):
         """Get most recent episodes
 
+        Served from the in-process ring buffer when possible; on a miss the
+        buffer is hydrated from Neo4j.
+
         Args:
             user_id: ID of the user
             limit: Maximum number of episodes to return
@@ -124,18 +236,23 @@ class EpisodicMemory:
         Returns:
             List of dictionaries containing message, role, and timestamp
         """
+        cached = self.recent.get(user_id, limit)
+        if cached is not None:
+            return cached
+
         try:
-            with self.driver.session() as session:
-                result = session.run("""
-                    MATCH (u:User {id: $user_id})-[:HAS_EPISODE]->(e:Episode)
-                    RETURN e.text AS message, e.role AS role, e.timestamp AS timestamp
-                    ORDER BY e.timestamp DESC
-                    LIMIT $limit
-                """, user_id=user_id, limit=limit)
-
-                episodes = [dict(record) for record in result]
-                logger.debug(f"Recalled {len(episodes)} recent episodes")
-                return episodes
+            token = self.recent.write_token(user_id)
+            records = self.db.read("""
+                MATCH (u:User {id: $user_id})-[:HAS_EPISODE]->(e:Episode)
+                RETURN e.text AS message, e.role AS role, e.timestamp AS timestamp
+                ORDER BY e.timestamp DESC
+                LIMIT $limit
+            """, user_id=user_id, limit=max(limit, self.recent.per_user))
+
+            episodes = [dict(record) for record in records]
+            self.recent.hydrate(user_id, episodes, token)
+            logger.debug(f"Recalled {len(episodes[:limit])} recent episodes")
+            return episodes[:limit]
         except Exception as e:
             logger.error(f"Failed to recall recent episodes: {e}")
             return []
@@ -143,6 +260,11 @@ class EpisodicMemory:
     def recall_related(self, user_id, query, limit=3):
         """Find related past episodes based on keywords
 
+        Episodes are looked up through the episode_text full-text index and
+        ranked by its BM25 score, with the most recent episode first among
+        equal scores. If the index cannot be queried, keyword overlap over
+        the MemoryWord graph is used instead.
+
         Args:
             user_id: ID of the user
             query: Text to find related episodes for
@@ -157,22 +279,57 @@ class EpisodicMemory:
                 logger.debug("No keywords extracted for recall_related")
                 return []
 
-            with self.driver.session() as session:
-                result = session.run("""
-                    MATCH (u:User {id: $user_id})-[:HAS_EPISODE]->(e:Episode)
-                    WHERE ANY(kw IN $keywords WHERE e.text CONTAINS kw)
-                    RETURN e.text AS message, e.role AS role, e.timestamp AS timestamp
-                    ORDER BY e.timestamp DESC
-                    LIMIT $limit
-                """, user_id=user_id, keywords=keywords, limit=limit)
-
-                episodes = [dict(record) for record in result]
-                logger.debug(f"Recalled {len(episodes)} related episodes")
-                return episodes
+            try:
+                episodes = self._recall_fulltext(user_id, query, keywords, limit)
+            except Exception as e:
+                logger.warning(f"Full-text recall unavailable, using keyword graph: {e}")
+                episodes = self._recall_keyword_overlap(user_id, keywords, limit)
+
+            logger.debug(f"Recalled {len(episodes)} related episodes")
+            return episodes
         except Exception as e:
             logger.error(f"Failed to recall related episodes: {e}")
             return []
 
+    def _recall_fulltext(self, user_id, query, keywords, limit):
+        """Rank the user's episodes by full-text score"""
+        terms = " OR ".join(self._search_terms(query, keywords))
+        search = f'user_id:"{self._escape_phrase(user_id)}" AND text:({terms})'
+        records = self.db.read("""
+            CALL db.index.fulltext.queryNodes('episode_text', $search) YIELD node, score
+            MATCH (:User {id: $user_id})-[:HAS_EPISODE]->(node)
+            RETURN node.text AS message, node.role AS role, node.timestamp AS timestamp
+            ORDER BY score DESC, node.timestamp DESC
+            LIMIT $limit
+        """, search=search, user_id=user_id, limit=limit)
+        return [dict(record) for record in records]
+
+    def _recall_keyword_overlap(self, user_id, keywords, limit):
+        """Rank the user's episodes by the number of shared MemoryWord nodes"""
+        records = self.db.read("""
+            UNWIND $keywords AS kw
+            MATCH (w:MemoryWord {text: kw})<-[:CONTAINS_WORD]-(e:Episode)
+            WHERE e.user_id = $user_id
+            WITH e, count(DISTINCT w) AS overlap
+            RETURN e.text AS message, e.role AS role, e.timestamp AS timestamp
+            ORDER BY overlap DESC, e.timestamp DESC
+            LIMIT $limit
+        """, user_id=user_id, keywords=keywords, limit=limit)
+        return [dict(record) for record in records]
+
+    def _search_terms(self, query, keywords):
+        """Keyword lemmas plus their surface forms, escaped for Lucene"""
+        analysis = self.nlp.analyze(query)
+        terms = dict.fromkeys(keywords)
+        for token, lemma in zip(analysis.tokens, analysis.lemmas):
+            if lemma.lower() in terms:
+                terms.setdefault(token.lower())
+        return [LUCENE_SPECIAL.sub(r"\\\1", term) for term in terms if term.strip()]
+
+    @staticmethod
+    def _escape_phrase(text):
+        return str(text).replace("\\", "\\\\").replace('"', '\\"')
+
     def _extract_keywords(self, text):
         """Extract important keywords from text
 
@@ -183,29 +340,9 @@ class EpisodicMemory:
             List of extracted keywords
         """
         try:
-            doc = nlp(text)
-            keywords = list(set([
-                token.lemma_.lower()
-                for token in doc
-                if not token.is_stop and token.pos_ in ("NOUN", "PROPN", "VERB")
-            ]))
+            keywords = list(self.nlp.analyze(text).keywords)
             logger.debug(f"Extracted keywords: {keywords}")
             return keywords
         except Exception as e:
             logger.error(f"Failed to extract keywords: {e}")
             return []
-
-    def close(self):
-        """Close the Neo4j driver connection"""
-        try:
-            if hasattr(self, 'driver') and self.driver:
-                self.driver.close()
-                logger.info("EpisodicMemory connection closed")
-        except Exception as e:
-            logger.error(f"Error closing EpisodicMemory: {e}")
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
\ No newline at end of file
@@ -0,0 +1,374 @@
+import logging
+import random
+import re
+import time
+from .connection import Neo4jConnection
+
+logger = logging.getLogger(__name__)
+
+# Ground facts projected into the graph; rules stay in Prolog
+FACT_RE = re.compile(
+    r"^\s*(father_of|mother_of|male|female)\(\s*([a-z]\w*)\s*(?:,\s*([a-z]\w*)\s*)?\)\s*\.\s*(?:%.*)?$"
+)
+
+
+def read_facts(pl_file):
+    """Parse the parent and gender facts of a Prolog file.
+
+    Args:
+        pl_file: Path of the .pl file
+
+    Returns:
+        Dictionary with 'genders' (name -> 'male'/'female') and 'parents'
+        (list of (parent, child, 'father'/'mother') without duplicates)
+    """
+    genders = {}
+    parents = {}
+    with open(pl_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = FACT_RE.match(line)
+            if not match:
+                continue
+            name, first, second = match.groups()
+            if name in ('male', 'female'):
+                if second is None:
+                    genders[first] = name
+            elif second is not None:
+                parents[(first, second)] = 'father' if name == 'father_of' else 'mother'
+    return {
+        'genders': genders,
+        'parents': [(parent, child, role) for (parent, child), role in parents.items()]
+    }
+
+
+def generate_tree(people, children=(1, 4), seed=42):
+    """Generate a random multi-generation family tree.
+
+    Args:
+        people: Approximate number of people to generate
+        children: (min, max) number of children per couple
+        seed: Random seed for reproducible trees
+
+    Returns:
+        Facts in the format returned by read_facts
+    """
+    rng = random.Random(seed)
+    genders = {}
+    parents = []
+
+    def person(gender):
+        name = f"p{len(genders):06d}"
+        genders[name] = gender
+        return name
+
+    generation = [person('male' if i % 2 == 0 else 'female') for i in range(max(2, people // 100))]
+    while len(genders) < people:
+        fathers = [p for p in generation if genders[p] == 'male']
+        mothers = [p for p in generation if genders[p] == 'female']
+        rng.shuffle(fathers)
+        rng.shuffle(mothers)
+        next_generation = []
+        for father, mother in zip(fathers, mothers):
+            for _ in range(rng.randint(*children)):
+                if len(genders) >= people:
+                    break
+                child = person(rng.choice(('male', 'female')))
+                parents.append((father, child, 'father'))
+                parents.append((mother, child, 'mother'))
+                next_generation.append(child)
+        if not next_generation:
+            break
+        generation = next_generation
+
+    return {'genders': genders, 'parents': parents}
+
+
+class KinshipGraph:
+    def __init__(self, connection, batch_size=5000):
+        """Initialize the kinship graph projection of the family knowledge base.
+
+        Args:
+            connection: Neo4jConnection, or a Neo4j driver to wrap in one
+            batch_size: Rows per UNWIND statement for bulk loads
+        """
+        self.db = Neo4jConnection.wrap(connection)
+        self.batch_size = batch_size
+        logger.info("KinshipGraph initialized successfully")
+
+    def _batches(self, rows):
+        for start in range(0, len(rows), self.batch_size):
+            yield rows[start:start + self.batch_size]
+
+    def load_facts(self, facts, replace=True):
+        """Bulk load parent and gender facts.
+
+        People and links are merged and stamped with the load's version
+        before anything is removed, so readers never see an emptied graph
+        and a failed load leaves the previous one in place. Of concurrent
+        loads, the one started last wins.
+
+        Args:
+            facts: Dictionary in the format returned by read_facts
+            replace: Remove PARENT_OF relationships and people that are not
+                in facts, making the graph an exact copy
+
+        Returns:
+            Dictionary with the number of people and parent links loaded
+            and of stale people and links removed
+        """
+        genders = facts['genders']
+        names = set(genders)
+        for parent, child, _ in facts['parents']:
+            names.update((parent, child))
+        people = [{'name': name, 'gender': genders.get(name)} for name in sorted(names)]
+        links = [{'parent': parent, 'child': child, 'role': role}
+                 for parent, child, role in facts['parents']]
+
+        version = time.time_ns()
+        try:
+            for batch in self._batches(people):
+                self.db.execute_write(self._write_people, batch, version)
+            for batch in self._batches(links):
+                self.db.execute_write(self._write_links, batch, version)
+            removed = self._remove_stale(version) if replace else {'people': 0, 'parents': 0}
+            logger.info(f"Loaded {len(people)} people and {len(links)} parent links into the kinship graph, "
+                        f"removed {removed['people']} people and {removed['parents']} links")
+            return {'people': len(people), 'parents': len(links),
+                    'removed_people': removed['people'], 'removed_parents': removed['parents']}
+        except Exception as e:
+            logger.error(f"Failed to load kinship facts: {e}")
+            raise
+
+    @staticmethod
+    def _write_people(tx, rows, version):
+        # A newer concurrent load keeps its values
+        tx.run("""
+            UNWIND $rows AS row
+            MERGE (p:Person {name: row.name})
+            WITH p, row WHERE coalesce(p.loaded, 0) <= $version
+            SET p.gender = row.gender,
+                p.loaded = $version
+        """, rows=rows, version=version).consume()
+
+    @staticmethod
+    def _write_links(tx, rows, version):
+        tx.run("""
+            UNWIND $rows AS row
+            MATCH (p:Person {name: row.parent})
+            MATCH (c:Person {name: row.child})
+            MERGE (p)-[r:PARENT_OF]->(c)
+            WITH r, row WHERE coalesce(r.loaded, 0) <= $version
+            SET r.role = row.role,
+                r.loaded = $version
+        """, rows=rows, version=version).consume()
+
+    def _remove_stale(self, version):
+        """Delete links and people older than version, in batches small
+        enough for one transaction.
+
+        Returns:
+            Dictionary with the number of people and parent links removed
+        """
+        removed = {}
+        for key, query in (('parents', """
+                MATCH ()-[r:PARENT_OF]->()
+                WHERE r.loaded IS NULL OR r.loaded < $version
+                WITH r LIMIT $limit
+                DELETE r
+                RETURN count(*) AS deleted
+            """), ('people', """
+                MATCH (p:Person)
+                WHERE p.loaded IS NULL OR p.loaded < $version
+                WITH p LIMIT $limit
+                DETACH DELETE p
+                RETURN count(*) AS deleted
+            """)):
+            removed[key] = 0
+            while True:
+                deleted = self.db.write(query, version=version, limit=self.batch_size)[0]['deleted']
+                if not deleted:
+                    break
+                removed[key] += deleted
+        return removed
+
+    def load_file(self, pl_file, replace=True):
+        """Project the facts of a Prolog file into the graph"""
+        return self.load_facts(read_facts(pl_file), replace=replace)
+
+    def export(self, pl_file):
+        """Write the graph back out as Prolog facts.
+
+        The generated file contains only father_of/mother_of/male/female
+        facts; consult it together with the rules of data/family.pl.
+
+        Returns:
+            Number of facts written
+        """
+        try:
+            people = self.db.read("""
+                MATCH (p:Person)
+                RETURN p.name AS name, p.gender AS gender
+                ORDER BY name
+            """)
+            links = self.db.read("""
+                MATCH (p:Person)-[r:PARENT_OF]->(c:Person)
+                RETURN p.name AS parent, c.name AS child, r.role AS role
+                ORDER BY parent, child
+            """)
+        except Exception as e:
+            logger.error(f"Failed to read kinship graph: {e}")
+            raise
+
+        sections = [
+            [f"{predicate}({link['parent']}, {link['child']})." for link in links if link['role'] == role]
+            for role, predicate in (('father', 'father_of'), ('mother', 'mother_of'))
+        ] + [
+            [f"{gender}({person['name']})." for person in people if person['gender'] == gender]
+            for gender in ('male', 'female')
+        ]
+        lines = ["% Exported from the Neo4j kinship graph", ""]
+        for section in sections:
+            if section:
+                lines += section + [""]
+
+        with open(pl_file, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines))
+        count = len(links) + sum(1 for person in people if person['gender'] in ('male', 'female'))
+        logger.info(f"Exported {count} kinship facts to {pl_file}")
+        return count
+
+    def ancestors(self, name, max_depth=None):
+        """Return ancestors of a person with their generation distance.
+
+        Returns:
+            List of (name, generations) sorted by distance
+        """
+        depth = f"1..{int(max_depth)}" if max_depth else "1.."
+        try:
+            records = self.db.read(f"""
+                MATCH path = (a:Person)-[:PARENT_OF*{depth}]->(:Person {{name: $name}})
+                RETURN a.name AS name, min(length(path)) AS generations
+                ORDER BY generations, name
+            """, name=name)
+            return [(record['name'], record['generations']) for record in records]
+        except Exception as e:
+            logger.error(f"Failed to find ancestors: {e}")
+            return []
+
+    def descendants(self, name, max_depth=None):
+        """Return descendants of a person with their generation distance"""
+        depth = f"1..{int(max_depth)}" if max_depth else "1.."
+        try:
+            records = self.db.read(f"""
+                MATCH path = (:Person {{name: $name}})-[:PARENT_OF*{depth}]->(d:Person)
+                RETURN d.name AS name, min(length(path)) AS generations
+                ORDER BY generations, name
+            """, name=name)
+            return [(record['name'], record['generations']) for record in records]
+        except Exception as e:
+            logger.error(f"Failed to find descendants: {e}")
+            return []
+
+    def cousins(self, name):
+        """Return first cousins, matching cousin_of/2 in data/family.pl"""
+        try:
+            records = self.db.read("""
+                MATCH (p:Person {name: $name})<-[:PARENT_OF]-(a:Person)
+                      <-[:PARENT_OF]-(:Person)-[:PARENT_OF]->(b:Person)
+                      -[:PARENT_OF]->(c:Person)
+                WHERE a <> b AND c <> p
+                RETURN DISTINCT c.name AS name
+                ORDER BY name
+            """, name=name)
+            return [record['name'] for record in records]
+        except Exception as e:
+            logger.error(f"Failed to find cousins: {e}")
+            return []
+
+    def relationship(self, name, other, max_depth=20):
+        """Find the closest common ancestor of two people.
+
+        Args:
+            name: First person
+            other: Second person
+            max_depth: Maximum number of generations searched upwards
+
+        Returns:
+            Dictionary with 'ancestor', generations 'up' from name and
+            'down' to other, and the civil 'degree' of relation (up + down),
+            or None if the two are not related by blood
+        """
+        try:
+            records = self.db.read(f"""
+                MATCH up = (a:Person)-[:PARENT_OF*0..{int(max_depth)}]->(:Person {{name: $name}})
+                WITH a, min(length(up)) AS up
+                MATCH down = (a)-[:PARENT_OF*0..{int(max_depth)}]->(:Person {{name: $other}})
+                WITH a, up, min(length(down)) AS down
+                RETURN a.name AS ancestor, up, down, up + down AS degree
+                ORDER BY degree, ancestor
+                LIMIT 1
+            """, name=name, other=other)
+            return dict(records[0]) if records else None
+        except Exception as e:
+            logger.error(f"Failed to find relationship: {e}")
+            return None
+
+    def stats(self):
+        return dict(self.db.read("""
+            MATCH (p:Person)
+            OPTIONAL MATCH (p)-[r:PARENT_OF]->()
+            RETURN count(DISTINCT p) AS people, count(r) AS parents
+        """)[0])
+
+
+def benchmark(graph, people=100000, samples=100, seed=42):
+    """Time a bulk load of a generated tree and a sample of path queries"""
+    rng = random.Random(seed)
+    facts = generate_tree(people, seed=seed)
+    names = sorted(facts['genders'])
+    print(f"Generated {len(names)} people and {len(facts['parents'])} parent links")
+
+    start = time.time()
+    graph.load_facts(facts)
+    print(f"Bulk load: {time.time() - start:.2f}s")
+
+    # People from the last generations have the deepest ancestry
+    subjects = [rng.choice(names[len(names) // 2:]) for _ in range(samples)]
+    for label, run in (
+        ("ancestors", lambda n: graph.ancestors(n)),
+        ("cousins", lambda n: graph.cousins(n)),
+        ("relationship", lambda n: graph.relationship(n, rng.choice(names)))
+    ):
+        start = time.time()
+        for name in subjects:
+            run(name)
+        elapsed = time.time() - start
+        print(f"{label}: {elapsed / samples * 1000:.1f} ms/query over {samples} queries")
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Sync the Prolog family facts with the Neo4j kinship graph")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("load", help="Load facts from a .pl file").add_argument("pl_file", nargs="?", default="data/family.pl")
+    commands.add_parser("export", help="Export facts to a .pl file").add_argument("pl_file")
+    bench = commands.add_parser("bench", help="Benchmark on a generated tree (replaces the graph)")
+    bench.add_argument("--people", type=int, default=100000)
+    bench.add_argument("--samples", type=int, default=100)
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    connection = Neo4jConnection.from_env()
+    try:
+        graph = KinshipGraph(connection)
+        if args.command == "load":
+            print(graph.load_file(args.pl_file))
+        elif args.command == "export":
+            print(f"Wrote {graph.export(args.pl_file)} facts to {args.pl_file}")
+        else:
+            benchmark(graph, people=args.people, samples=args.samples)
+    finally:
+        connection.close()
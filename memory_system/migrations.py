@@ -0,0 +1,241 @@
+import logging
+from .connection import Neo4jConnection
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_ID = 'memory_system'
+
+
+def _drop_sentence_timestamp_constraint(db):
+    """Unique timestamps collide between concurrent inputs; the constraint
+    was created unnamed, so it has to be looked up first"""
+    for record in db.read("""
+        SHOW CONSTRAINTS YIELD name, labelsOrTypes, properties
+        WHERE labelsOrTypes = ['Sentence'] AND properties = ['timestamp']
+        RETURN name
+    """):
+        db.write(f"DROP CONSTRAINT `{record['name']}` IF EXISTS")
+
+
+def _rebuild_social_aggregates(db):
+    """Compute the aggregates of posts written before they were maintained"""
+    from .social_memory import SocialMemory
+    SocialMemory(db).rebuild_aggregates()
+
+
+# Ordered schema migrations: (version, description, statements). A statement
+# is Cypher, or a callable taking the Neo4jConnection for steps that depend on
+# the database or need Python code. Statements using CALL { } IN TRANSACTIONS
+# run in an auto-commit transaction. Never change what an applied migration
+# does; append a new one instead.
+MIGRATIONS = [
+    (1, "Baseline constraints and indexes of all memory systems", [
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (u:User) REQUIRE u.id IS UNIQUE",
+        "CREATE INDEX IF NOT EXISTS FOR (m:Memory) ON (m.memory_type)",
+        # Episodic
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (e:Episode) REQUIRE e.id IS UNIQUE",
+        "CREATE INDEX IF NOT EXISTS FOR (e:Episode) ON (e.timestamp)",
+        "CREATE INDEX IF NOT EXISTS FOR (w:MemoryWord) ON (w.text)",
+        """
+        CREATE FULLTEXT INDEX episode_text IF NOT EXISTS
+        FOR (e:Episode) ON EACH [e.text, e.user_id]
+        """,
+        # Episodes written before user_id was stored on the node
+        """
+        MATCH (u:User)-[:HAS_EPISODE]->(e:Episode)
+        WHERE e.user_id IS NULL
+        CALL { WITH u, e SET e.user_id = u.id } IN TRANSACTIONS OF 10000 ROWS
+        """,
+        # Sensory
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (s:Sentence) REQUIRE s.timestamp IS UNIQUE",
+        "CREATE INDEX IF NOT EXISTS FOR (w:Word) ON (w.text)",
+        "CREATE INDEX IF NOT EXISTS FOR (s:Sentence) ON (s.timestamp)",
+        # Motor
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (a:Action) REQUIRE a.id IS UNIQUE",
+        "CREATE INDEX IF NOT EXISTS FOR (a:Action) ON (a.timestamp)",
+        # Semantic
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (s:Subject) REQUIRE s.name IS UNIQUE",
+        "CREATE INDEX IF NOT EXISTS FOR (f:Fact) ON (f.content)",
+        # Social
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (u:SocialUser) REQUIRE u.id IS UNIQUE",
+        "CREATE INDEX IF NOT EXISTS FOR (p:SocialPost) ON (p.timestamp)",
+        # Kinship graph
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (p:Person) REQUIRE p.name IS UNIQUE",
+    ]),
+    (2, "Per-analysis PAM sentiment and indexed entity/POS lookups", [
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (a:PAMAnalysis) REQUIRE a.id IS UNIQUE",
+        "CREATE INDEX IF NOT EXISTS FOR (a:PAMAnalysis) ON (a.user_id, a.timestamp)",
+        "CREATE INDEX IF NOT EXISTS FOR (e:Entity) ON (e.text)",
+        "CREATE INDEX IF NOT EXISTS FOR (p:POSTag) ON (p.tag)",
+    ]),
+    (3, "Identify sentences by generated id instead of timestamp", [
+        _drop_sentence_timestamp_constraint,
+        """
+        MATCH (s:Sentence) WHERE s.id IS NULL
+        CALL { WITH s SET s.id = randomUUID() } IN TRANSACTIONS OF 10000 ROWS
+        """,
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (s:Sentence) REQUIRE s.id IS UNIQUE",
+    ]),
+    (4, "Per-user motor action events and counters", [
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (e:ActionEvent) REQUIRE e.id IS UNIQUE",
+        "CREATE INDEX IF NOT EXISTS FOR (e:ActionEvent) ON (e.user_id, e.timestamp)",
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (c:ActionCount) REQUIRE (c.user_id, c.action) IS UNIQUE",
+        "CREATE INDEX IF NOT EXISTS FOR (c:ActionCount) ON (c.user_id, c.count)",
+        # Each PERFORMED link to a shared Action becomes one event of the
+        # user; every batch deletes the links it converted, so a failed run
+        # resumes where it stopped
+        """
+        MATCH (u:User)-[r:PERFORMED]->(a:Action)
+        CALL {
+            WITH u, r, a
+            CREATE (u)-[:PERFORMED]->(:ActionEvent:Memory {
+                id: randomUUID(),
+                user_id: u.id,
+                action: a.text,
+                timestamp: coalesce(a.timestamp, datetime()),
+                memory_type: 'motor'
+            })
+            MERGE (c:ActionCount {user_id: u.id, action: a.text})
+            ON CREATE SET c.count = 0, c.first_at = coalesce(a.timestamp, datetime())
+            SET c.count = c.count + 1,
+                c.last_at = coalesce(a.timestamp, datetime())
+            DELETE r
+        } IN TRANSACTIONS OF 5000 ROWS
+        """,
+        """
+        MATCH (a:Action)
+        CALL { WITH a DETACH DELETE a } IN TRANSACTIONS OF 10000 ROWS
+        """,
+    ]),
+    (5, "Incrementally maintained social aggregates", [
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (t:SocialTopic) REQUIRE (t.user_id, t.key) IS UNIQUE",
+        _rebuild_social_aggregates,
+    ]),
+    (6, "Versioned kinship graph loads", [
+        "CREATE INDEX IF NOT EXISTS FOR (p:Person) ON (p.loaded)",
+        "CREATE INDEX IF NOT EXISTS FOR ()-[r:PARENT_OF]-() ON (r.loaded)",
+    ]),
+]
+
+
+class SchemaMigrator:
+    """Applies pending MIGRATIONS once and records the schema version.
+
+    The version lives on a single (:SchemaVersion {id: 'memory_system'})
+    node, so an up-to-date database costs one read at startup.
+    """
+
+    def __init__(self, connection, migrations=None):
+        """
+        Args:
+            connection: Neo4jConnection, or a Neo4j driver to wrap in one
+            migrations: Optional migration list, defaults to MIGRATIONS
+        """
+        self.db = Neo4jConnection.wrap(connection)
+        self.migrations = migrations or MIGRATIONS
+
+    @property
+    def latest_version(self):
+        return self.migrations[-1][0]
+
+    def current_version(self):
+        """Return the applied schema version, 0 for a new database"""
+        records = self.db.read("""
+            MATCH (v:SchemaVersion {id: $id})
+            RETURN v.version AS version
+        """, id=SCHEMA_ID)
+        return records[0]['version'] if records else 0
+
+    def pending(self, current=None):
+        """Return the migrations newer than the applied version"""
+        if current is None:
+            current = self.current_version()
+        return [migration for migration in self.migrations if migration[0] > current]
+
+    def migrate(self):
+        """Apply pending migrations in order.
+
+        Every migration runs while a write transaction holds the lock on the
+        SchemaVersion node, and the version is re-read under that lock, so
+        processes starting concurrently apply each migration exactly once.
+
+        Returns:
+            The schema version after migrating
+        """
+        current = self.current_version()
+        if current >= self.latest_version:
+            logger.debug(f"Schema is up to date at version {current}")
+            return current
+
+        for version, description, statements in self.pending(current):
+            # Another process may have applied several migrations meanwhile
+            if version > current:
+                current = self._apply_locked(version, description, statements)
+        return current
+
+    def _apply_locked(self, version, description, statements):
+        """Apply one migration under the schema lock.
+
+        Returns:
+            The schema version after the migration
+        """
+        with self.db.driver.session(database=self.db.database) as session:
+            with session.begin_transaction() as lock:
+                # Blocks until a concurrent migrator commits its version
+                current = lock.run("""
+                    MERGE (v:SchemaVersion {id: $id})
+                    SET v.locked_at = datetime()
+                    RETURN coalesce(v.version, 0) AS version
+                """, id=SCHEMA_ID).single()['version']
+                if current >= version:
+                    logger.info(f"Schema migration {version} was applied by another process")
+                    return current
+
+                try:
+                    # Schema changes cannot share a transaction with data
+                    # writes, so every statement runs in its own; none of
+                    # them touches the locked SchemaVersion node
+                    for statement in statements:
+                        if callable(statement):
+                            statement(self.db)
+                        elif "IN TRANSACTIONS" in statement.upper():
+                            self.db.write_autocommit(statement)
+                        else:
+                            self.db.write(statement)
+                except Exception as e:
+                    logger.error(f"Schema migration {version} failed: {e}")
+                    raise
+
+                lock.run("""
+                    MATCH (v:SchemaVersion {id: $id})
+                    SET v.version = $version,
+                        v.description = $description,
+                        v.updated_at = datetime()
+                    REMOVE v.locked_at
+                """, id=SCHEMA_ID, version=version, description=description).consume()
+                lock.commit()
+        logger.info(f"Applied schema migration {version}: {description}")
+        return version
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Apply pending Neo4j schema migrations")
+    parser.add_argument("--status", action="store_true", help="Only show the schema version")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    connection = Neo4jConnection.from_env()
+    try:
+        migrator = SchemaMigrator(connection)
+        if args.status:
+            current = migrator.current_version()
+            print(f"Schema version {current} of {migrator.latest_version}, "
+                  f"{len(migrator.pending(current))} pending")
+        else:
+            print(f"Schema at version {migrator.migrate()}")
+    finally:
+        connection.close()
@@ -1,107 +1,163 @@
-from neo4j import GraphDatabase
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timezone
+from collections import Counter
 import uuid
+from .connection import Neo4jConnection
 
 logger = logging.getLogger(__name__)
 
 
 class MotorMemory:
-    def __init__(self, driver):
-        """Initialize Motor Memory system with existing Neo4j driver.
+    """Per-user, time-ordered stream of motor actions.
+
+    Every action is its own (:ActionEvent) node, linked to the user and
+    indexed by (user_id, timestamp), so a user's history is read newest first
+    from the index. A (:ActionCount) node per user and action holds a running
+    count, so frequency questions never scan events. No node is shared
+    between users, which keeps concurrent writers off each other's locks.
+    """
+
+    def __init__(self, connection):
+        """Initialize Motor Memory system with the shared Neo4j connection.
 
         Args:
-            driver: Neo4j driver instance (GraphDatabase.driver)
+            connection: Neo4jConnection, or a Neo4j driver to wrap in one
         """
-        if not hasattr(driver, 'session'):
-            raise ValueError("Driver must be a Neo4j GraphDatabase driver instance")
-
-        self.driver = driver
-        self._initialize_schema()
+        self.db = Neo4jConnection.wrap(connection)
         logger.info("MotorMemory initialized successfully")
 
-    def _initialize_schema(self):
-        """Create necessary constraints and indexes"""
+    def store_action(self, user_id, action_text, detail=None):
+        """Store a motor action in the database."""
+        self.store_actions([(user_id, action_text, detail)])
+
+    def store_actions(self, actions):
+        """Store many motor actions in one transaction.
+
+        Args:
+            actions: Iterable of (user_id, action_text) or
+                (user_id, action_text, detail) tuples, in the order performed
+
+        Returns:
+            List of generated event ids
+        """
+        # Microsecond timestamps, strictly increasing within the batch
+        start = time.time_ns() // 1000
+        events = []
+        for offset, (user_id, action_text, *detail) in enumerate(actions):
+            events.append({
+                'id': str(uuid.uuid4()),
+                'user_id': user_id,
+                'action': action_text,
+                'detail': detail[0] if detail else None,
+                'at': datetime.fromtimestamp((start + offset) / 1e6, timezone.utc).isoformat()
+            })
+        if not events:
+            return []
+
+        # One counter update per (user, action) however often it repeats
+        counts = Counter((event['user_id'], event['action']) for event in events)
+        last_at = {(event['user_id'], event['action']): event['at'] for event in events}
+        counters = [{'user_id': user_id, 'action': action, 'n': n, 'at': last_at[(user_id, action)]}
+                    for (user_id, action), n in sorted(counts.items())]
         try:
-            queries = [
-                "CREATE CONSTRAINT IF NOT EXISTS FOR (a:Action) REQUIRE a.id IS UNIQUE",
-                "CREATE INDEX IF NOT EXISTS FOR (a:Action) ON (a.timestamp)"
-            ]
-
-            with self.driver.session() as session:
-                for query in queries:
-                    session.run(query)
-            logger.debug("MotorMemory schema initialized")
+            self.db.execute_write(self._write_actions, events, counters)
+            logger.info(f"Stored {len(events)} motor actions")
+            return [event['id'] for event in events]
         except Exception as e:
-            logger.error(f"Schema initialization failed: {e}")
+            logger.error(f"Failed to store action: {e}")
             raise
 
-    def store_action(self, user_id, action_text):
-        """Store a motor action in the database."""
+    @staticmethod
+    def _write_actions(tx, events, counters):
+        tx.run("""
+            UNWIND $events AS row
+            MERGE (u:User {id: row.user_id})
+            CREATE (u)-[:PERFORMED]->(e:ActionEvent:Memory {
+                id: row.id,
+                user_id: row.user_id,
+                action: row.action,
+                detail: row.detail,
+                timestamp: datetime(row.at),
+                memory_type: 'motor'
+            })
+        """, events=events).consume()
+        tx.run("""
+            UNWIND $counters AS row
+            MERGE (c:ActionCount {user_id: row.user_id, action: row.action})
+            ON CREATE SET c.count = 0,
+                c.first_at = datetime(row.at)
+            SET c.count = c.count + row.n,
+                c.last_at = datetime(row.at)
+        """, counters=counters).consume()
+
+    def get_actions(self, user_id, limit=50):
+        """Retrieve the last actions of a user, newest first."""
         try:
             query = """
-            MERGE (u:User {id: $user_id})
-            MERGE (a:Action {text: $action_text})
-            ON CREATE SET 
-                a.id = randomUUID(),
-                a.timestamp = datetime(),
-                a:Memory,
-                a.memory_type = 'motor'
-            MERGE (u)-[:PERFORMED]->(a)
+            MATCH (e:ActionEvent {user_id: $user_id})
+            WHERE e.timestamp IS NOT NULL
+            RETURN e.action AS action, e.detail AS detail, e.timestamp AS time
+            ORDER BY e.timestamp DESC
+            LIMIT $limit
             """
 
-            with self.driver.session() as session:
-                session.run(query, user_id=user_id, action_text=action_text)
-            logger.info(f"Stored motor action for user {user_id}")
+            return [dict(record) for record in self.db.read(query, user_id=user_id, limit=limit)]
         except Exception as e:
-            logger.error(f"Failed to store action: {e}")
-            raise
+            logger.error(f"Failed to get actions: {e}")
+            return []
 
-    def get_actions(self, user_id):
-        """Retrieve actions for a specific user."""
+    def most_frequent_actions(self, user_id, limit=10):
+        """Return a user's most performed actions from the running counters.
+
+        Returns:
+            List of dictionaries with action, count and last_at
+        """
         try:
             query = """
-            MATCH (u:User {id: $user_id})-[:PERFORMED]->(a:Action)
-            RETURN a.text AS action, a.timestamp AS time
-            ORDER BY a.timestamp DESC
+            MATCH (c:ActionCount {user_id: $user_id})
+            RETURN c.action AS action, c.count AS count, c.last_at AS last_at
+            ORDER BY count DESC, last_at DESC
+            LIMIT $limit
             """
 
-            with self.driver.session() as session:
-                result = session.run(query, user_id=user_id)
-                return [dict(record) for record in result]
+            return [dict(record) for record in self.db.read(query, user_id=user_id, limit=limit)]
         except Exception as e:
-            logger.error(f"Failed to get actions: {e}")
+            logger.error(f"Failed to get action counts: {e}")
+            return []
+
+    def store_greeting(self, user_id, greeting):
+        """Remember a greeting taught by the user."""
+        self.store_action(user_id, "greeting", greeting)
+
+    def recall_greetings(self, user_id, limit=20):
+        """Return the distinct greetings a user taught, most recent first."""
+        try:
+            query = """
+            MATCH (e:ActionEvent {user_id: $user_id, action: 'greeting'})
+            WITH e.detail AS greeting, max(e.timestamp) AS last
+            RETURN greeting
+            ORDER BY last DESC
+            LIMIT $limit
+            """
+
+            return [record['greeting'] for record in self.db.read(query, user_id=user_id, limit=limit)]
+        except Exception as e:
+            logger.error(f"Failed to recall greetings: {e}")
             return []
 
     def visualize_motor_memories(self, user_id=None):
         """Retrieve motor memories for visualization."""
         try:
             query = """
-            MATCH (u:User)-[r:PERFORMED]->(a:Action)
+            MATCH (u:User)-[r:PERFORMED]->(a:ActionEvent)
             WHERE $user_id IS NULL OR u.id = $user_id
             RETURN u, r, a
             ORDER BY a.timestamp DESC
             LIMIT 50
             """
 
-            with self.driver.session() as session:
-                result = session.run(query, user_id=user_id)
-                return list(result)
+            return self.db.read(query, user_id=user_id)
         except Exception as e:
             logger.error(f"Failed to visualize memories: {e}")
             return []
-
-    def close(self):
-        """Close the Neo4j driver connection."""
-        try:
-            if hasattr(self, 'driver') and self.driver:
-                self.driver.close()
-                logger.info("MotorMemory connection closed")
-        except Exception as e:
-            logger.error(f"Error closing connection: {e}")
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
\ No newline at end of file
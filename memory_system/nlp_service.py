@@ -0,0 +1,129 @@
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import spacy
+from textblob import TextBlob
+
+logger = logging.getLogger(__name__)
+
+KEYWORD_POS = ("NOUN", "PROPN", "VERB")
+
+
+def sentiment_label(polarity):
+    """Convert polarity score to human-readable label"""
+    if polarity > 0.1:
+        return "positive"
+    elif polarity < -0.1:
+        return "negative"
+    return "neutral"
+
+
+@dataclass(frozen=True)
+class TextAnalysis:
+    """Result of parsing one utterance, shared by all memory systems"""
+    text: str
+    tokens: tuple
+    lemmas: tuple
+    pos: tuple
+    entities: tuple
+    sentiment: dict
+    keywords: tuple
+
+    @property
+    def pos_tags(self):
+        """List of (word, POS) tuples"""
+        return list(zip(self.tokens, self.pos))
+
+
+class NLPService:
+    """Owns the single spaCy model and caches one analysis per utterance"""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, model="en_core_web_sm", cache_size=1024):
+        """Load the spaCy model.
+
+        Args:
+            model: Name of the spaCy model to load
+            cache_size: Maximum number of cached analyses
+        """
+        try:
+            self.nlp = spacy.load(model)
+            logger.info(f"NLP model {model} loaded successfully")
+        except Exception as e:
+            logger.error(f"Failed to load NLP model {model}: {e}")
+            raise
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide default service, loading it on first use"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def analyze(self, text):
+        """Parse text once and return its cached TextAnalysis.
+
+        Args:
+            text: Input text to analyze
+
+        Returns:
+            TextAnalysis with tokens, lemmas, POS tags, entities, sentiment
+            and keywords
+        """
+        with self._lock:
+            analysis = self._cache.get(text)
+            if analysis is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return analysis
+            self.misses += 1
+
+        analysis = self._parse(text)
+
+        with self._lock:
+            self._cache[text] = analysis
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return analysis
+
+    def _parse(self, text):
+        doc = self.nlp(text)
+        blob = TextBlob(text)
+        polarity = blob.sentiment.polarity
+
+        keywords = dict.fromkeys(
+            token.lemma_.lower()
+            for token in doc
+            if not token.is_stop and token.pos_ in KEYWORD_POS
+        )
+
+        return TextAnalysis(
+            text=text,
+            tokens=tuple(token.text for token in doc),
+            lemmas=tuple(token.lemma_ for token in doc),
+            pos=tuple(token.pos_ for token in doc),
+            entities=tuple((ent.text, ent.label_) for ent in doc.ents),
+            sentiment={
+                'polarity': polarity,
+                'subjectivity': blob.sentiment.subjectivity,
+                'label': sentiment_label(polarity)
+            },
+            keywords=tuple(keywords)
+        )
+
+    def stats(self):
+        """Return cache size and hit/miss counters"""
+        with self._lock:
+            return {'size': len(self._cache), 'hits': self.hits, 'misses': self.misses}
@@ -1,55 +1,32 @@
-import spacy
-from textblob import TextBlob
 import gender_guesser.detector as gender
-from neo4j import GraphDatabase
 import logging
+import uuid
+from datetime import datetime
+from .connection import Neo4jConnection
+from .nlp_service import NLPService, sentiment_label
 
 logger = logging.getLogger(__name__)
 
 class PAMMemory:
-    def __init__(self, driver):
-        """Initialize PAM (Perception-Action Memory) system with existing Neo4j driver.
+    def __init__(self, connection, nlp_service=None):
+        """Initialize PAM (Perception-Action Memory) system with the shared Neo4j connection.
 
         Args:
-            driver: Neo4j driver instance (GraphDatabase.driver)
+            connection: Neo4jConnection, or a Neo4j driver to wrap in one
+            nlp_service: Optional shared NLPService, defaults to the
+                process-wide instance
         """
-        # Validate driver instance
-        if not hasattr(driver, 'session'):
-            raise ValueError("Driver must be a Neo4j GraphDatabase driver instance")
+        self.db = Neo4jConnection.wrap(connection)
 
         # Initialize NLP components
         try:
-            self.nlp = spacy.load("en_core_web_sm")
+            self.nlp = nlp_service or NLPService.shared()
             self.gender_detector = gender.Detector()
-            self.driver = driver
             logger.info("NLP components loaded successfully")
         except Exception as e:
             logger.error(f"Failed to initialize NLP components: {e}")
             raise
 
-        # Initialize database schema
-        self._initialize_schema()
-
-    def _initialize_schema(self):
-        """Initialize database constraints and indexes"""
-        try:
-            with self.driver.session() as session:
-                # Create constraints
-                session.run("""
-                    CREATE CONSTRAINT IF NOT EXISTS 
-                    FOR (u:User) REQUIRE u.id IS UNIQUE
-                """)
-
-                # Create indexes
-                session.run("""
-                    CREATE INDEX IF NOT EXISTS 
-                    FOR (m:Memory) ON (m.memory_type)
-                """)
-            logger.info("PAM schema initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize PAM schema: {e}")
-            raise
-
     def analyze_text(self, text):
         """Perform comprehensive NLP analysis on text.
 
@@ -64,25 +41,20 @@ class PAMMemory:
             - gender: Detected gender if person found
         """
         try:
-            doc = self.nlp(text)
-            blob = TextBlob(text)
+            analysis = self.nlp.analyze(text)
 
             # Get first person name for gender detection
             gender_result = "unknown"
-            for ent in doc.ents:
-                if ent.label_ == "PERSON":
-                    first_name = ent.text.split()[0]
+            for ent_text, ent_label in analysis.entities:
+                if ent_label == "PERSON":
+                    first_name = ent_text.split()[0]
                     gender_result = self.gender_detector.get_gender(first_name)
                     break
 
             return {
-                'pos_tags': [(token.text, token.pos_) for token in doc],
-                'entities': [(ent.text, ent.label_) for ent in doc.ents],
-                'sentiment': {
-                    'polarity': blob.sentiment.polarity,
-                    'subjectivity': blob.sentiment.subjectivity,
-                    'label': self._sentiment_label(blob.sentiment.polarity)
-                },
+                'pos_tags': analysis.pos_tags,
+                'entities': list(analysis.entities),
+                'sentiment': dict(analysis.sentiment),
                 'gender': gender_result
             }
         except Exception as e:
@@ -104,84 +76,122 @@ class PAMMemory:
         Args:
             user_id: ID of user associated with this analysis
             analysis: Dictionary from analyze_text()
+
+        Returns:
+            ID of the stored PAMAnalysis node
+        """
+        return self.store_pam_analyses([(user_id, analysis)])[0]
+
+    def store_pam_analyses(self, analyses):
+        """Store several analyses in one transaction of three UNWIND statements.
+
+        Sentiment and inferred gender are kept on a PAMAnalysis node per
+        analysis rather than on shared nodes. Entity, Word and POSTag nodes
+        are still shared between users: MERGE and the relationships linked
+        to them take write locks on those nodes, so concurrent writers
+        contend on the entities, words and tags they have in common.
+
+        Args:
+            analyses: List of (user_id, analysis) tuples
+
+        Returns:
+            List of PAMAnalysis IDs in the same order as the input
         """
-        def _store_analysis(tx, uid, analysis):
-            try:
-                # Store base user node
-                tx.run("MERGE (u:User {id: $uid})", uid=uid)
-
-                # Store sentiment analysis
-                tx.run("""
-                    MERGE (s:Sentiment {label: $label})
-                    SET s.polarity = $polarity,
-                        s.subjectivity = $subjectivity,
-                        s:Memory,
-                        s.memory_type = 'sentiment'
-                    MERGE (u)-[:EXPRESSED]->(s)
-                """,
-                       label=analysis['sentiment']['label'],
-                       polarity=analysis['sentiment']['polarity'],
-                       subjectivity=analysis['sentiment']['subjectivity'],
-                       uid=uid)
-
-                # Store all entities
-                for text, label in analysis['entities']:
-                    memory_type = self._classify_entity(label)
-                    tx.run("""
-                        MERGE (e:Entity {text: $text})
-                        SET e.type = $type,
-                            e:Memory,
-                            e.memory_type = $memory_type
-                        MERGE (u)-[:MENTIONED]->(e)
-                    """,
-                           text=text,
-                           type=label,
-                           memory_type=memory_type,
-                           uid=uid)
-
-                # Store words with POS tags
-                for word, pos in analysis['pos_tags']:
-                    memory_type = self._classify_word(word, pos)
-                    tx.run("""
-                        MERGE (w:Word {text: $word})
-                        SET w.pos = $pos,
-                            w:Memory,
-                            w.memory_type = $memory_type
-                        MERGE (p:POSTag {tag: $pos})
-                        MERGE (w)-[:HAS_POS]->(p)
-                        MERGE (u)-[:USED]->(w)
-                    """,
-                           word=word,
-                           pos=pos,
-                           memory_type=memory_type,
-                           uid=uid)
-
-                # Store gender information
-                tx.run("""
-                    MERGE (g:Gender {value: $gender})
-                    MERGE (u)-[:INFERRED_GENDER]->(g)
-                """,
-                       gender=analysis['gender'],
-                       uid=uid)
-            except Exception as e:
-                logger.error(f"Failed to store analysis in transaction: {e}")
-                raise
+        if not analyses:
+            return []
+
+        timestamp = datetime.now().isoformat()
+        records, entities, words = [], {}, {}
+        for user_id, analysis in analyses:
+            # Callers such as the login handler pass partial analyses; one
+            # must not fail the whole batch
+            sentiment = analysis.get('sentiment') or {}
+            polarity = sentiment.get('polarity', 0)
+            records.append({
+                'id': str(uuid.uuid4()),
+                'user_id': user_id,
+                'timestamp': timestamp,
+                'sentiment': sentiment.get('label') or self._sentiment_label(polarity),
+                'polarity': polarity,
+                'subjectivity': sentiment.get('subjectivity', 0),
+                'gender': analysis.get('gender', 'unknown')
+            })
+            for text, label in analysis.get('entities', []):
+                entities[(user_id, text)] = {
+                    'user_id': user_id,
+                    'text': text,
+                    'type': label,
+                    'memory_type': self._classify_entity(label)
+                }
+            for word, pos in analysis.get('pos_tags', []):
+                words.setdefault((user_id, word), {
+                    'user_id': user_id,
+                    'text': word,
+                    'pos': pos,
+                    'memory_type': self._classify_word(word, pos)
+                })
 
         try:
-            with self.driver.session() as session:
-                session.write_transaction(_store_analysis, user_id, analysis)
-            logger.debug(f"Stored PAM analysis for user {user_id}")
+            # Entity and Word nodes are write-locked in sorted text order
+            # so that concurrent batches cannot deadlock on each other
+            self.db.execute_write(
+                self._write_analyses,
+                records,
+                [entities[key] for key in sorted(entities, key=lambda k: (k[1], k[0]))],
+                [words[key] for key in sorted(words, key=lambda k: (k[1], k[0]))]
+            )
+            logger.debug(f"Stored {len(records)} PAM analyses")
+            return [record['id'] for record in records]
         except Exception as e:
             logger.error(f"Failed to store PAM analysis: {e}")
             raise
 
+    @staticmethod
+    def _write_analyses(tx, records, entities, words):
+        tx.run("""
+            UNWIND $records AS rec
+            MERGE (u:User {id: rec.user_id})
+            CREATE (a:PAMAnalysis {
+                id: rec.id,
+                user_id: rec.user_id,
+                timestamp: rec.timestamp,
+                sentiment: rec.sentiment,
+                polarity: rec.polarity,
+                subjectivity: rec.subjectivity,
+                gender: rec.gender
+            })
+            SET a:Memory,
+                a.memory_type = 'sentiment'
+            CREATE (u)-[:EXPRESSED]->(a)
+        """, records=records).consume()
+
+        if entities:
+            tx.run("""
+                UNWIND $entities AS ent
+                MATCH (u:User {id: ent.user_id})
+                MERGE (e:Entity {text: ent.text})
+                ON CREATE SET e.type = ent.type,
+                              e:Memory,
+                              e.memory_type = ent.memory_type
+                MERGE (u)-[:MENTIONED]->(e)
+            """, entities=entities).consume()
+
+        if words:
+            tx.run("""
+                UNWIND $words AS row
+                MATCH (u:User {id: row.user_id})
+                MERGE (w:Word {text: row.text})
+                ON CREATE SET w.pos = row.pos,
+                              w:Memory,
+                              w.memory_type = row.memory_type
+                MERGE (p:POSTag {tag: row.pos})
+                MERGE (w)-[:HAS_POS]->(p)
+                MERGE (u)-[:USED]->(w)
+            """, words=words).consume()
+
     def _sentiment_label(self, polarity):
         """Convert polarity score to human-readable label"""
-        if polarity > 0.1:
-            return "positive"
-        elif polarity < -0.1:
-            return "negative"
-        return "neutral"
+        return sentiment_label(polarity)
 
     def _classify_entity(self, label):
         """Map entity types to memory categories"""
@@ -221,19 +231,9 @@ class PAMMemory:
         LIMIT 200
         """
         try:
-            with self.driver.session() as session:
-                result = list(session.run(query, uid=user_id))
-                logger.debug(f"Retrieved {len(result)} memory graph records")
-                return result
+            result = self.db.read(query, uid=user_id)
+            logger.debug(f"Retrieved {len(result)} memory graph records")
+            return result
         except Exception as e:
             logger.error(f"Failed to visualize memory graph: {e}")
             return []
-
-    def close(self):
-        """Clean up resources"""
-        try:
-            if hasattr(self, 'driver') and self.driver:
-                self.driver.close()
-                logger.info("PAMMemory resources cleaned up")
-        except Exception as e:
-            logger.error(f"Error closing PAMMemory: {e}")
\ No newline at end of file
@@ -1,58 +1,32 @@
-from neo4j import GraphDatabase
 import logging
+from .connection import Neo4jConnection
 
 logger = logging.getLogger(__name__)
 
 
 class SemanticMemory:
-    def __init__(self, driver):
-        """Initialize Semantic Memory system with existing Neo4j driver.
+    def __init__(self, connection):
+        """Initialize Semantic Memory system with the shared Neo4j connection.
 
         Args:
-            driver: Neo4j driver instance (GraphDatabase.driver)
+            connection: Neo4jConnection, or a Neo4j driver to wrap in one
         """
-        if not hasattr(driver, 'session'):
-            raise ValueError("Driver must be a Neo4j GraphDatabase driver instance")
-
-        self.driver = driver
-        self._initialize_schema()
+        self.db = Neo4jConnection.wrap(connection)
         logger.info("SemanticMemory initialized successfully")
 
-    def _initialize_schema(self):
-        """Initialize database constraints and indexes"""
-        try:
-            with self.driver.session() as session:
-                session.run("""
-                    CREATE CONSTRAINT IF NOT EXISTS 
-                    FOR (s:Subject) REQUIRE s.name IS UNIQUE
-                """)
-                session.run("""
-                    CREATE INDEX IF NOT EXISTS 
-                    FOR (f:Fact) ON (f.content)
-                """)
-                session.run("""
-                    CREATE INDEX IF NOT EXISTS 
-                    FOR (m:Memory) ON (m.memory_type)
-                """)
-            logger.debug("SemanticMemory schema initialized")
-        except Exception as e:
-            logger.error(f"Schema initialization failed: {e}")
-            raise
-
     def add_fact(self, subject, description):
         """Store a semantic fact in the knowledge graph."""
         try:
-            with self.driver.session() as session:
-                session.run("""
-                    MERGE (s:Subject {name: $subject})
-                    SET s.description = $description,
-                        s:Memory,
-                        s.memory_type = 'semantic'
-                    MERGE (f:Fact {content: $description})
-                    SET f:Memory,
-                        f.memory_type = 'semantic'
-                    MERGE (s)-[:HAS_FACT]->(f)
-                """, subject=subject, description=description)
+            self.db.write("""
+                MERGE (s:Subject {name: $subject})
+                SET s.description = $description,
+                    s:Memory,
+                    s.memory_type = 'semantic'
+                MERGE (f:Fact {content: $description})
+                SET f:Memory,
+                    f.memory_type = 'semantic'
+                MERGE (s)-[:HAS_FACT]->(f)
+            """, subject=subject, description=description)
             logger.info(f"Stored semantic fact: {subject} - {description}")
         except Exception as e:
             logger.error(f"Failed to add fact: {e}")
@@ -61,13 +35,11 @@ class SemanticMemory:
     def get_fact(self, subject):
         """Retrieve a specific fact by subject."""
         try:
-            with self.driver.session() as session:
-                result = session.run("""
-                    MATCH (s:Subject {name: $subject})
-                    RETURN s.description AS desc
-                """, subject=subject)
-                record = result.single()
-                return record["desc"] if record else None
+            records = self.db.read("""
+                MATCH (s:Subject {name: $subject})
+                RETURN s.description AS desc
+            """, subject=subject)
+            return records[0]["desc"] if records else None
         except Exception as e:
             logger.error(f"Failed to get fact: {e}")
             return None
@@ -75,14 +47,13 @@ class SemanticMemory:
     def get_facts(self, subject=None):
         """Get multiple facts with optional filtering."""
         try:
-            with self.driver.session() as session:
-                result = session.run("""
-                    MATCH (s:Subject)
-                    WHERE $subject IS NULL OR s.name = $subject
-                    RETURN s.name AS subject, s.description AS description
-                    ORDER BY s.name
-                """, subject=subject)
-                return [dict(record) for record in result]
+            records = self.db.read("""
+                MATCH (s:Subject)
+                WHERE $subject IS NULL OR s.name = $subject
+                RETURN s.name AS subject, s.description AS description
+                ORDER BY s.name
+            """, subject=subject)
+            return [dict(record) for record in records]
         except Exception as e:
             logger.error(f"Failed to get facts: {e}")
             return []
@@ -90,29 +61,13 @@ class SemanticMemory:
     def visualize_semantic_memories(self):
         """Visualize semantic memories in Neo4j."""
         try:
-            with self.driver.session() as session:
-                result = session.run("""
-                    MATCH (s:Subject)-[r:HAS_FACT]->(f:Fact)
-                    WHERE s:Memory AND f:Memory
-                    RETURN s, r, f
-                    LIMIT 50
-                """)
-                return [dict(record) for record in result]
+            records = self.db.read("""
+                MATCH (s:Subject)-[r:HAS_FACT]->(f:Fact)
+                WHERE s:Memory AND f:Memory
+                RETURN s, r, f
+                LIMIT 50
+            """)
+            return [dict(record) for record in records]
         except Exception as e:
             logger.error(f"Failed to visualize memories: {e}")
             return []
-
-    def close(self):
-        """Close the Neo4j driver connection."""
-        try:
-            if hasattr(self, 'driver') and self.driver:
-                self.driver.close()
-                logger.info("SemanticMemory connection closed")
-        except Exception as e:
-            logger.error(f"Error closing connection: {e}")
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
\ No newline at end of file
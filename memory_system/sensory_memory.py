@@ -1,98 +1,206 @@
-from neo4j import GraphDatabase
+import heapq
+import itertools
+import threading
 import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime
 import logging
+from .connection import Neo4jConnection
+from .write_behind import WriteBehindQueue
 
 logger = logging.getLogger(__name__)
 
 
+class SensoryBuffer:
+    """Short-lived store of what is currently perceived.
+
+    Items expire ``ttl`` seconds after they were added, tracked with a
+    min-heap of expiry times, and the buffer never holds more than
+    ``max_items``; the oldest items are evicted first when it is full.
+    """
+
+    def __init__(self, max_items=1000, ttl=2.0):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._expiry = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.added = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def add(self, item, ttl=None):
+        """Add an item, evicting expired and, if full, the oldest items.
+
+        Returns:
+            Sequence number identifying the item in the buffer
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            seq = next(self._seq)
+            self._items[seq] = item
+            heapq.heappush(self._expiry, (now + (self.ttl if ttl is None else ttl), seq))
+            self.added += 1
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                self.evicted += 1
+            return seq
+
+    def _expire(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            _, seq = heapq.heappop(self._expiry)
+            if self._items.pop(seq, None) is not None:
+                self.expired += 1
+        # Entries of evicted items are left in the heap until they expire
+        if len(self._expiry) > 2 * self.max_items:
+            self._expiry = [entry for entry in self._expiry if entry[1] in self._items]
+            heapq.heapify(self._expiry)
+
+    def perceived(self, user_id=None):
+        """Return the live items, oldest first, optionally for one user"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return [item for item in self._items.values()
+                    if user_id is None or item['user_id'] == user_id]
+
+    def __len__(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._items)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._items),
+                'max_items': self.max_items,
+                'added': self.added,
+                'expired': self.expired,
+                'evicted': self.evicted
+            }
+
+
 class SensoryMemory:
-    def __init__(self, driver):
-        """Initialize Sensory Memory system with existing Neo4j driver.
+    def __init__(self, connection, buffer_size=1000, ttl=2.0, consolidate=False,
+                 batch_size=100, flush_interval=1.0):
+        """Initialize Sensory Memory system with the shared Neo4j connection.
 
         Args:
-            driver: Neo4j driver instance (GraphDatabase.driver)
+            connection: Neo4jConnection, or a Neo4j driver to wrap in one
+            buffer_size: Maximum number of inputs held in the sensory buffer
+            ttl: Seconds an input stays perceived
+            consolidate: Write inputs to Neo4j in background batches; when
+                False every input is written before add_input returns. Only
+                enable it if close() is called on shutdown, or inputs still
+                queued are lost
+            batch_size: Maximum inputs per consolidation transaction
+            flush_interval: Maximum seconds an input waits for consolidation
         """
-        if not hasattr(driver, 'session'):
-            raise ValueError("Driver must be a Neo4j GraphDatabase driver instance")
-
-        self.driver = driver
-        self.sensory_data = {}
-        self.expiration_time = 2.0  # seconds
-        self._initialize_schema()
+        self.db = Neo4jConnection.wrap(connection)
+        self.buffer = SensoryBuffer(buffer_size, ttl)
+        self.expiration_time = ttl  # seconds
+        self.consolidation = None
+        if consolidate:
+            self.consolidation = WriteBehindQueue(
+                self._consolidate,
+                max_size=buffer_size,
+                batch_size=batch_size,
+                flush_interval=flush_interval,
+                name="sensory-consolidation"
+            )
         logger.info("SensoryMemory initialized successfully")
 
-    def _initialize_schema(self):
-        """Initialize database constraints and indexes"""
-        try:
-            with self.driver.session() as session:
-                session.run("""
-                    CREATE CONSTRAINT IF NOT EXISTS 
-                    FOR (s:Sentence) REQUIRE s.timestamp IS UNIQUE
-                """)
-                session.run("""
-                    CREATE INDEX IF NOT EXISTS 
-                    FOR (w:Word) ON (w.text)
-                """)
-                session.run("""
-                    CREATE INDEX IF NOT EXISTS 
-                    FOR (s:Sentence) ON (s.timestamp)
-                """)
-            logger.debug("SensoryMemory schema initialized")
-        except Exception as e:
-            logger.error(f"Schema initialization failed: {e}")
-            raise
-
     def add_input(self, user_id, input_type, data):
-        """Store sensory input with sentence-word relationships tied to user"""
-        try:
-            timestamp = datetime.now().isoformat()
-            self.sensory_data[timestamp] = {
-                'type': input_type,
-                'data': data,
-                'expires': time.time() + self.expiration_time
-            }
+        """Perceive an input and queue it for consolidation into Neo4j as
+        sentence-word relationships tied to the user"""
+        timestamp = datetime.now().isoformat()
+        self.add_inputs([{
+            'user_id': user_id,
+            'input_type': input_type,
+            'data': data,
+            'timestamp': timestamp
+        }])
+        return timestamp
+
+    def add_inputs(self, events):
+        """Perceive a stream of inputs, e.g. a batch of sensor or text events.
 
-            memory_type = self._classify_input(data)
-
-            with self.driver.session() as session:
-                session.run("""
-                    MERGE (u:User {id: $user_id})
-                    SET u:SensoryUser
-                """, user_id=user_id)
-
-                sentence_result = session.run("""
-                    MATCH (u:User {id: $user_id})
-                    CREATE (s:Sentence {
-                        text: $text, 
-                        type: $input_type, 
-                        memory_type: $memory_type,
-                        timestamp: $timestamp
-                    })
-                    SET s:Sensory, s:Memory
-                    MERGE (u)-[:PERCEIVED]->(s)
-                    RETURN id(s)
-                """, user_id=user_id, text=data, input_type=input_type,
-                                              memory_type=memory_type, timestamp=timestamp)
-                sentence_id = sentence_result.single()[0]
-
-                words = data.split()
-                for i, word in enumerate(words):
-                    session.run("""
-                        MATCH (s:Sentence) WHERE id(s) = $sentence_id
-                        MERGE (w:Word {text: $word})
-                        CREATE (s)-[r:CONTAINS {
-                            position: $position,
-                            timestamp: $timestamp
-                        }]->(w)
-                    """, sentence_id=sentence_id, word=word.lower(),
-                                position=i, timestamp=timestamp)
-
-            return timestamp
+        Args:
+            events: List of dictionaries with user_id, input_type, data and
+                an optional ISO timestamp
+
+        Returns:
+            List of the generated Sentence IDs in the same order as the input
+        """
+        try:
+            items = [self._prepare_input(**event) for event in events]
+            unqueued = []
+            for item in items:
+                self.buffer.add(item)
+                if not (self.consolidation and self.consolidation.submit(item)):
+                    unqueued.append(item)
+            if unqueued:
+                self._consolidate(unqueued)
+            return [item['id'] for item in items]
         except Exception as e:
             logger.error(f"Failed to add sensory input: {e}")
             raise
 
+    def _prepare_input(self, user_id, input_type, data, timestamp=None):
+        return {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'type': input_type,
+            'data': data,
+            'words': [word.lower() for word in data.split()],
+            'memory_type': self._classify_input(data),
+            'timestamp': timestamp or datetime.now().isoformat()
+        }
+
+    def perceived(self, user_id=None):
+        """Inputs that are currently perceived, i.e. not yet expired
+
+        Args:
+            user_id: Optional user ID to filter by
+
+        Returns:
+            List of dictionaries with the Sentence id, user_id, type, data,
+            words, memory_type and timestamp, oldest first
+        """
+        return self.buffer.perceived(user_id)
+
+    def _consolidate(self, items):
+        """Write a batch of inputs to Neo4j in one transaction"""
+        self.db.execute_write(self._write_inputs, items)
+        logger.debug(f"Consolidated {len(items)} sensory inputs")
+
+    @staticmethod
+    def _write_inputs(tx, items):
+        """Write sentences and their word links in one statement"""
+        tx.run("""
+            UNWIND $items AS item
+            MERGE (u:User {id: item.user_id})
+            SET u:SensoryUser
+            CREATE (s:Sentence {
+                id: item.id,
+                text: item.data,
+                type: item.type,
+                memory_type: item.memory_type,
+                timestamp: item.timestamp
+            })
+            SET s:Sensory, s:Memory
+            CREATE (u)-[:PERCEIVED]->(s)
+            FOREACH (position IN range(0, size(item.words) - 1) |
+                MERGE (w:Word {text: item.words[position]})
+                CREATE (s)-[:CONTAINS {
+                    position: position,
+                    timestamp: item.timestamp
+                }]->(w)
+            )
+        """, items=items).consume()
+
     def _classify_input(self, text):
         """Auto-classify sensory input into specific memory types"""
         text_lower = text.lower()
@@ -105,13 +213,12 @@ class SensoryMemory:
     def get_sensory_inputs(self, user_id):
         """Get sensory inputs for a user"""
         try:
-            with self.driver.session() as session:
-                result = session.run("""
-                    MATCH (u:User {id: $uid})-[:PERCEIVED]->(s:Sentence)
-                    RETURN s.text AS text, s.type AS type, s.timestamp AS timestamp
-                    ORDER BY s.timestamp DESC
-                """, uid=user_id)
-                return [dict(record) for record in result]
+            records = self.db.read("""
+                MATCH (u:User {id: $uid})-[:PERCEIVED]->(s:Sentence)
+                RETURN s.text AS text, s.type AS type, s.timestamp AS timestamp
+                ORDER BY s.timestamp DESC
+            """, uid=user_id)
+            return [dict(record) for record in records]
         except Exception as e:
             logger.error(f"Failed to get sensory inputs: {e}")
             return []
@@ -126,24 +233,18 @@ class SensoryMemory:
             ORDER BY s.timestamp DESC
             LIMIT 50
             """
-            with self.driver.session() as session:
-                result = session.run(query, uid=user_id)
-                return list(result)
+            return self.db.read(query, uid=user_id)
         except Exception as e:
             logger.error(f"Failed to visualize memories: {e}")
             return []
 
-    def close(self):
-        """Close the Neo4j driver connection."""
-        try:
-            if hasattr(self, 'driver') and self.driver:
-                self.driver.close()
-                logger.info("SensoryMemory connection closed")
-        except Exception as e:
-            logger.error(f"Error closing connection: {e}")
-
-    def __enter__(self):
-        return self
+    def stats(self):
+        return {
+            'buffer': self.buffer.stats(),
+            'consolidation': self.consolidation.stats() if self.consolidation else None
+        }
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
\ No newline at end of file
+    def close(self):
+        """Consolidate queued inputs and stop the consolidation thread"""
+        if self.consolidation:
+            self.consolidation.close(timeout=30)
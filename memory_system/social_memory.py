@@ -1,46 +1,59 @@
-from neo4j import GraphDatabase
 from datetime import datetime
+import hashlib
 import logging
+from .connection import Neo4jConnection
 
 logger = logging.getLogger(__name__)
 
 
+def _topic_key(text):
+    # Posts can be longer than an index entry allows, so topics are keyed by hash
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _update_top(texts, counts, text, count, top_k):
+    """Fold a topic's new count into a top-K list.
+
+    Counts only grow, so a topic that drops out of the top K can only come
+    back through its own update.
+    """
+    top = dict(zip(texts or [], counts or []))
+    top[text] = count
+    ranked = sorted(top.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+    return [text for text, _ in ranked], [count for _, count in ranked]
+
+
 class SocialMemory:
-    def __init__(self, driver):
-        """Initialize Social Memory system with existing Neo4j driver.
+    """Social posts with per-user aggregates maintained on write.
+
+    Each SocialUser carries its post_count and its top_k most frequent
+    topics (top_topics/top_topic_counts), and a (:SocialTopic) node per user
+    and post text holds the full count. log_interaction updates all of them
+    in the transaction that creates the post, so insights are a single node
+    read whatever the number of posts. rebuild_aggregates recomputes them
+    from the posts.
+    """
+
+    def __init__(self, connection, top_k=5):
+        """Initialize Social Memory system with the shared Neo4j connection.
 
         Args:
-            driver: Neo4j driver instance (GraphDatabase.driver)
+            connection: Neo4jConnection, or a Neo4j driver to wrap in one
+            top_k: Number of top topics kept per user
         """
-        if not hasattr(driver, 'session'):
-            raise ValueError("Driver must be a Neo4j GraphDatabase driver instance")
-
-        self.driver = driver
-        self._initialize_schema()
+        self.db = Neo4jConnection.wrap(connection)
+        self.top_k = top_k
         logger.info("SocialMemory initialized successfully")
 
-    def _initialize_schema(self):
-        """Initialize database constraints and indexes"""
-        try:
-            with self.driver.session() as session:
-                session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (u:SocialUser) REQUIRE u.id IS UNIQUE")
-                session.run("CREATE INDEX IF NOT EXISTS FOR (p:SocialPost) ON (p.timestamp)")
-                session.run("CREATE INDEX IF NOT EXISTS FOR (m:Memory) ON (m.memory_type)")
-            logger.debug("SocialMemory schema initialized")
-        except Exception as e:
-            logger.error(f"Schema initialization failed: {e}")
-            raise
-
     def register_user(self, user_id):
         """Register a new social user"""
         try:
-            with self.driver.session() as session:
-                session.run("""
-                    MERGE (u:SocialUser {id: $user_id})
-                    SET u.created_at = datetime(),
-                        u:Memory,
-                        u.memory_type = 'social'
-                """, user_id=user_id)
+            self.db.write("""
+                MERGE (u:SocialUser {id: $user_id})
+                SET u.created_at = datetime(),
+                    u:Memory,
+                    u.memory_type = 'social'
+            """, user_id=user_id)
             logger.info(f"Registered social user {user_id}")
         except Exception as e:
             logger.error(f"Failed to register user: {e}")
@@ -50,31 +63,46 @@ class SocialMemory:
         """Log a social interaction"""
         try:
             timestamp = datetime.now().isoformat()
-            with self.driver.session() as session:
-                session.run("""
-                    MERGE (u:SocialUser {id: $user_id})
-                    CREATE (m:SocialPost {
-                        text: $message,
-                        timestamp: $timestamp,
-                        memory_type: 'social'
-                    })
-                    SET m:Memory
-                    MERGE (u)-[:POSTED]->(m)
-                """, user_id=user_id, message=message, timestamp=timestamp)
+            self.db.execute_write(self._write_interaction, user_id, message, timestamp, self.top_k)
             logger.info(f"Logged interaction for user {user_id}")
         except Exception as e:
             logger.error(f"Failed to log interaction: {e}")
             raise
 
+    @staticmethod
+    def _write_interaction(tx, user_id, message, timestamp, top_k):
+        # Updating the user first holds its lock for the rest of the
+        # transaction, so concurrent posts cannot interleave their top-K updates
+        record = tx.run("""
+            MERGE (u:SocialUser {id: $user_id})
+            SET u.post_count = coalesce(u.post_count, 0) + 1,
+                u.last_post_at = $timestamp
+            CREATE (u)-[:POSTED]->(m:SocialPost:Memory {
+                text: $message,
+                timestamp: $timestamp,
+                memory_type: 'social'
+            })
+            MERGE (t:SocialTopic {user_id: $user_id, key: $key})
+            ON CREATE SET t.text = $message, t.count = 0
+            SET t.count = t.count + 1
+            RETURN t.count AS count, u.top_topics AS texts, u.top_topic_counts AS counts
+        """, user_id=user_id, message=message, timestamp=timestamp, key=_topic_key(message)).single()
+
+        texts, counts = _update_top(record['texts'], record['counts'], message, record['count'], top_k)
+        if texts != record['texts'] or counts != record['counts']:
+            tx.run("""
+                MATCH (u:SocialUser {id: $user_id})
+                SET u.top_topics = $texts, u.top_topic_counts = $counts
+            """, user_id=user_id, texts=texts, counts=counts).consume()
+
     def get_interaction_count(self, user_id):
         """Get count of interactions for a user"""
         try:
-            with self.driver.session() as session:
-                result = session.run("""
-                    MATCH (u:SocialUser {id: $user_id})-[:POSTED]->(post)
-                    RETURN count(post) as count
-                """, user_id=user_id)
-                return result.single()["count"]
+            records = self.db.read("""
+                MATCH (u:SocialUser {id: $user_id})
+                RETURN coalesce(u.post_count, 0) AS count
+            """, user_id=user_id)
+            return records[0]["count"] if records else 0
         except Exception as e:
             logger.error(f"Failed to get interaction count: {e}")
             return 0
@@ -82,15 +110,13 @@ class SocialMemory:
     def visualize_social_memories(self, user_id=None):
         """Visualize social memories in Neo4j"""
         try:
-            with self.driver.session() as session:
-                result = session.run("""
-                    MATCH (u:SocialUser)-[r:POSTED]->(m)
-                    WHERE ($uid IS NULL OR u.id = $uid)
-                    AND m:Memory AND m.memory_type = 'social'
-                    RETURN u, r, m
-                    LIMIT 100
-                """, uid=user_id)
-                return list(result)
+            return self.db.read("""
+                MATCH (u:SocialUser)-[r:POSTED]->(m)
+                WHERE ($uid IS NULL OR u.id = $uid)
+                AND m:Memory AND m.memory_type = 'social'
+                RETURN u, r, m
+                LIMIT 100
+            """, uid=user_id)
         except Exception as e:
             logger.error(f"Failed to visualize memories: {e}")
             return []
@@ -98,38 +124,83 @@ class SocialMemory:
     def get_social_insights(self, user_id):
         """Get social insights for a user"""
         try:
-            with self.driver.session() as session:
-                stats = session.run("""
-                    MATCH (u:SocialUser {id: $user_id})-[:POSTED]->(post)
-                    RETURN count(post) as post_count
-                """, user_id=user_id).single()
-
-                topics = session.run("""
-                    MATCH (u:SocialUser {id: $user_id})-[:POSTED]->(post)
-                    RETURN post.text as text, count(*) as freq
-                    ORDER BY freq DESC
-                    LIMIT 5
-                """, user_id=user_id).data()
-
-                return {
-                    'post_count': stats["post_count"] if stats else 0,
-                    'top_topics': topics
-                }
+            records = self.db.read("""
+                MATCH (u:SocialUser {id: $user_id})
+                RETURN coalesce(u.post_count, 0) AS post_count,
+                       coalesce(u.top_topics, []) AS texts,
+                       coalesce(u.top_topic_counts, []) AS counts
+            """, user_id=user_id)
+            if not records:
+                return {'post_count': 0, 'top_topics': []}
+            record = records[0]
+            return {
+                'post_count': record['post_count'],
+                'top_topics': [{'text': text, 'freq': freq}
+                               for text, freq in zip(record['texts'], record['counts'])]
+            }
         except Exception as e:
             logger.error(f"Failed to get social insights: {e}")
             return {'post_count': 0, 'top_topics': []}
 
-    def close(self):
-        """Close the Neo4j driver connection."""
+    def rebuild_aggregates(self, user_id=None):
+        """Recompute post counts, topic counts and top topics from the posts.
+
+        Args:
+            user_id: Only rebuild this user, default all users
+
+        Returns:
+            Number of users rebuilt
+        """
         try:
-            if hasattr(self, 'driver') and self.driver:
-                self.driver.close()
-                logger.info("SocialMemory connection closed")
+            if user_id is None:
+                user_ids = [record['id'] for record in self.db.read("MATCH (u:SocialUser) RETURN u.id AS id")]
+            else:
+                user_ids = [user_id]
+            for uid in user_ids:
+                self.db.execute_write(self._rebuild_user, uid, self.top_k)
+            logger.info(f"Rebuilt social aggregates of {len(user_ids)} users")
+            return len(user_ids)
         except Exception as e:
-            logger.error(f"Error closing connection: {e}")
-
-    def __enter__(self):
-        return self
+            logger.error(f"Failed to rebuild social aggregates: {e}")
+            raise
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
\ No newline at end of file
+    @staticmethod
+    def _rebuild_user(tx, user_id, top_k):
+        topics = tx.run("""
+            MATCH (:SocialUser {id: $user_id})-[:POSTED]->(post)
+            RETURN post.text AS text, count(*) AS freq
+        """, user_id=user_id).data()
+        rows = [{'key': _topic_key(topic['text']), 'text': topic['text'], 'count': topic['freq']}
+                for topic in topics if topic['text'] is not None]
+        ranked = sorted(rows, key=lambda row: (-row['count'], row['text']))[:top_k]
+
+        tx.run("MATCH (t:SocialTopic {user_id: $user_id}) DELETE t", user_id=user_id).consume()
+        tx.run("""
+            UNWIND $rows AS row
+            CREATE (:SocialTopic {user_id: $user_id, key: row.key, text: row.text, count: row.count})
+        """, user_id=user_id, rows=rows).consume()
+        tx.run("""
+            MATCH (u:SocialUser {id: $user_id})
+            SET u.post_count = $post_count,
+                u.top_topics = $texts,
+                u.top_topic_counts = $counts
+        """, user_id=user_id, post_count=sum(topic['freq'] for topic in topics),
+               texts=[row['text'] for row in ranked], counts=[row['count'] for row in ranked]).consume()
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Recompute social aggregates from the stored posts")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user", help="Only rebuild this user")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    connection = Neo4jConnection.from_env()
+    try:
+        print(f"Rebuilt {SocialMemory(connection).rebuild_aggregates(args.user)} users")
+    finally:
+        connection.close()
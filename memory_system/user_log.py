@@ -0,0 +1,223 @@
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class UserLog:
+    """Append-only JSON-lines conversation log per user.
+
+    Each user has an active ``<user>_log.jsonl`` file. Once it grows past
+    ``max_bytes`` it is rotated to ``<user>_log.<n>.jsonl`` (gzipped when
+    ``compress`` is set) and a fresh active file is started. Every user has
+    a lock of their own, and segments are compressed outside of it.
+    """
+
+    BLOCK_SIZE = 8192
+
+    def __init__(self, log_dir, max_bytes=5 * 1024 * 1024, compress=True):
+        """Initialize the log store.
+
+        Args:
+            log_dir: Directory holding the user log files
+            max_bytes: Size at which the active file is rotated
+            compress: Whether rotated segments are gzipped
+        """
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._user_locks = {}
+        os.makedirs(self.log_dir, exist_ok=True)
+
+    def _user_lock(self, user_id):
+        with self._lock:
+            lock = self._user_locks.get(user_id)
+            if lock is None:
+                lock = self._user_locks[user_id] = threading.Lock()
+            return lock
+
+    def _active_path(self, user_id):
+        return os.path.join(self.log_dir, f"{user_id}_log.jsonl")
+
+    def _legacy_path(self, user_id):
+        return os.path.join(self.log_dir, f"{user_id}_log.json")
+
+    def _segments(self, user_id):
+        """Return rotated segments as (number, path) sorted oldest first"""
+        pattern = re.compile(rf"^{re.escape(str(user_id))}_log\.(\d+)\.jsonl(\.gz)?$")
+        segments = {}
+        for name in os.listdir(self.log_dir):
+            match = pattern.match(name)
+            if match:
+                number = int(match.group(1))
+                # While a segment is being compressed both files exist
+                if number not in segments or not match.group(2):
+                    segments[number] = os.path.join(self.log_dir, name)
+        return sorted(segments.items())
+
+    def append(self, user_id, entry):
+        """Append a single entry to the user's log.
+
+        Args:
+            user_id: ID of the user
+            entry: JSON-serializable dictionary
+        """
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        path = self._active_path(user_id)
+        segment_path = None
+        with self._user_lock(user_id):
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                size = f.tell()
+            if size >= self.max_bytes:
+                segment_path = self._rotate(user_id)
+        if segment_path and self.compress:
+            self._compress(segment_path)
+
+    def _rotate(self, user_id):
+        """Move the active file to the next numbered segment.
+
+        Returns:
+            Path of the new, uncompressed segment
+        """
+        segments = self._segments(user_id)
+        number = segments[-1][0] + 1 if segments else 1
+        segment_path = os.path.join(self.log_dir, f"{user_id}_log.{number}.jsonl")
+        os.replace(self._active_path(user_id), segment_path)
+        logger.debug(f"Rotated log for user {user_id} to segment {number}")
+        return segment_path
+
+    def _compress(self, segment_path):
+        """Gzip a rotated segment; readers see the plain file until it is done"""
+        tmp_path = segment_path + ".gz.tmp"
+        with open(segment_path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, segment_path + ".gz")
+        os.remove(segment_path)
+
+    def tail(self, user_id, n=10):
+        """Return the last ``n`` entries, oldest first.
+
+        The active file is read backwards from its end, so the cost depends
+        on ``n`` rather than on the size of the history.
+        """
+        if n <= 0:
+            return []
+
+        with self._user_lock(user_id):
+            entries = self._read_tail(self._active_path(user_id), n)
+            for _, path in reversed(self._segments(user_id)):
+                if len(entries) >= n:
+                    break
+                needed = n - len(entries)
+                if not path.endswith(".gz"):
+                    try:
+                        older = self._read_tail(path, needed, missing_ok=False)
+                    except FileNotFoundError:
+                        # Compressed since the segments were listed
+                        path += ".gz"
+                if path.endswith(".gz"):
+                    older = self._read_gzip_tail(path, needed)
+                entries = older + entries
+        return entries
+
+    def _read_tail(self, path, n, missing_ok=True):
+        """Seek from the end of a plain file and decode its last n lines"""
+        if missing_ok and not os.path.exists(path):
+            return []
+
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b""
+            # One extra newline is needed to be sure the first line is complete
+            while position > 0 and data.count(b"\n") <= n:
+                step = min(self.BLOCK_SIZE, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+
+        lines = data.splitlines()
+        if position > 0:
+            lines = lines[1:]
+        return self._decode(lines[-n:])
+
+    def _read_gzip_tail(self, path, n):
+        """Gzip streams cannot seek backwards, so keep a bounded window"""
+        with gzip.open(path, 'rb') as f:
+            return self._decode(deque(f, maxlen=n))
+
+    def _decode(self, lines):
+        entries = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # A torn write from a crash only affects its own line
+                logger.warning(f"Skipping malformed log line: {line[:80]!r}")
+        return entries
+
+    def migrate(self, user_id):
+        """Convert a legacy ``<user>_log.json`` file to JSON lines.
+
+        Entries from the legacy file are placed before anything already in
+        the active file. The original is kept as ``<user>_log.json.migrated``.
+
+        Returns:
+            Number of migrated entries
+        """
+        legacy_path = self._legacy_path(user_id)
+        if not os.path.exists(legacy_path):
+            return 0
+
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+
+        with self._user_lock(user_id):
+            active_path = self._active_path(user_id)
+            tmp_path = active_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as out:
+                for entry in entries:
+                    out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                if os.path.exists(active_path):
+                    with open(active_path, 'r', encoding='utf-8') as current:
+                        shutil.copyfileobj(current, out)
+            os.replace(tmp_path, active_path)
+            os.replace(legacy_path, legacy_path + ".migrated")
+
+        logger.info(f"Migrated {len(entries)} log entries for user {user_id}")
+        return len(entries)
+
+    def migrate_all(self):
+        """Migrate every legacy log file in the log directory.
+
+        Returns:
+            Dictionary of user ID to number of migrated entries
+        """
+        migrated = {}
+        for name in os.listdir(self.log_dir):
+            if name.endswith("_log.json"):
+                user_id = name[:-len("_log.json")]
+                try:
+                    migrated[user_id] = self.migrate(user_id)
+                except Exception as e:
+                    logger.error(f"Failed to migrate log for user {user_id}: {e}")
+        return migrated
+
+
+if __name__ == "__main__":
+    import sys
+
+    log_dir = sys.argv[1] if len(sys.argv) > 1 else "./user_logs"
+    results = UserLog(log_dir).migrate_all()
+    print(f"Migrated {sum(results.values())} entries for {len(results)} users")
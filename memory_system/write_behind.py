@@ -0,0 +1,155 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """Bounded in-process queue drained by a background writer thread.
+
+    Items are handed to ``handler`` in batches of up to ``batch_size``, or
+    whatever has accumulated once ``flush_interval`` seconds have passed
+    since the first item of the batch was taken.
+    """
+
+    def __init__(self, handler, max_size=1000, batch_size=50, flush_interval=0.5,
+                 put_timeout=1.0, name="write-behind"):
+        """Start the writer thread.
+
+        Args:
+            handler: Callable receiving a list of queued items
+            max_size: Maximum number of pending items
+            batch_size: Maximum number of items per handler call
+            flush_interval: Maximum seconds a batch waits to fill up
+            put_timeout: Seconds submit() blocks on a full queue
+            name: Name of the writer thread, used in log messages
+        """
+        self.handler = handler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.name = name
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stopping = threading.Event()
+        # Submits in progress; close() waits for them before draining
+        self._submitting = 0
+        self._submit_done = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'failed': 0,
+            'rejected': 0,
+            'batches': 0,
+            'last_lag': 0.0,
+            'max_lag': 0.0
+        }
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        logger.info(f"{name} queue started (max_size={max_size}, batch_size={batch_size})")
+
+    def submit(self, item):
+        """Queue an item, blocking up to put_timeout while the queue is full.
+
+        Returns:
+            True if the item was queued, False if the caller must write it
+            itself because the queue stayed full or is shutting down
+        """
+        with self._submit_done:
+            if self._stopping.is_set():
+                return False
+            self._submitting += 1
+        try:
+            self._queue.put((time.monotonic(), item), timeout=self.put_timeout)
+        except queue.Full:
+            self._count('rejected')
+            logger.warning(f"{self.name} queue full, item rejected after {self.put_timeout}s")
+            return False
+        finally:
+            with self._submit_done:
+                self._submitting -= 1
+                self._submit_done.notify_all()
+        self._count('enqueued')
+        return True
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+
+            batch = [first]
+            deadline = first[0] + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0 and not self._stopping.is_set():
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            self.handler([item for _, item in batch])
+            lag = time.monotonic() - batch[0][0]
+            with self._stats_lock:
+                self._stats['written'] += len(batch)
+                self._stats['batches'] += 1
+                self._stats['last_lag'] = lag
+                self._stats['max_lag'] = max(self._stats['max_lag'], lag)
+        except Exception as e:
+            self._count('failed', len(batch))
+            logger.error(f"{self.name} batch of {len(batch)} items failed: {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self, timeout=None):
+        """Wait until every queued item has been handled.
+
+        Returns:
+            True if the queue drained within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Stop accepting items, drain the queue and stop the writer thread"""
+        with self._submit_done:
+            self._stopping.set()
+            # Items of submits already past the check are drained too
+            self._submit_done.wait_for(lambda: not self._submitting)
+        drained = self.flush(timeout)
+        self._thread.join(timeout)
+        if not drained:
+            logger.error(f"{self.name} queue closed with {self._queue.qsize()} unwritten items")
+        logger.info(f"{self.name} queue stopped")
+
+    def stats(self):
+        """Return queue depth, throughput counters and write lag in seconds"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['depth'] = self._queue.qsize()
+        stats['max_size'] = self._queue.maxsize
+        return stats
@@ -0,0 +1,66 @@
+def register(router, chatbot):
+    """Register the motor memory commands of the chat UI"""
+
+    def motor():
+        return getattr(chatbot.memory, 'motor', None)
+
+    @router.prefix("STORE GREETING")
+    def store_greeting(user_id, query, greeting):
+        if greeting and motor():
+            motor().store_greeting(user_id, greeting)
+            return "Got it. I'll store this greeting pattern in motor memory."
+        return "Please provide a valid greeting to store."
+
+    @router.prefix("SHOW GREETINGS")
+    def show_greetings(user_id, query, rest):
+        if not motor():
+            return "Motor memory system not available"
+        greetings = motor().recall_greetings(user_id)
+        if not greetings:
+            return "I haven't learned any greetings yet."
+        return "Here's what I've learned from motor memory:\n" + "\n".join(
+            f"{i + 1}. {g}" for i, g in enumerate(greetings))
+
+    def action(name):
+        def handler(user_id, query, rest):
+            if motor():
+                motor().store_action(user_id, name)
+            return f"Command acknowledged: {name.replace('_', ' ')}. Logged in motor memory."
+        return handler
+
+    router.prefix("MOVE FORWARD")(action("move_forward"))
+    router.prefix("HOW DO I WALK")(action("walk_instructions"))
+
+    @router.prefix("PERFORM ACTION")
+    def perform_action(user_id, query, rest):
+        action_name = rest.lower()
+        if motor():
+            motor().store_action(user_id, f"perform_{action_name}")
+        return f"Initiating motor sequence for: {action_name}. Pattern stored."
+
+    @router.prefix("EXECUTE SEQUENCE")
+    def execute_sequence(user_id, query, rest):
+        sequence = rest.lower()
+        if motor():
+            motor().store_action(user_id, f"execute_{sequence}")
+        return f"Executing sequence: {sequence}. Referencing motor memory graph."
+
+    @router.prefix("SHOW ACTIONS")
+    def show_actions(user_id, query, rest):
+        if not motor():
+            return "Motor memory system not available"
+        actions = motor().get_actions(user_id, limit=int(rest) if rest.isdigit() else 10)
+        if not actions:
+            return "You haven't performed any actions yet."
+        return "Your last actions:\n" + "\n".join(
+            f"{i + 1}. {a['action'].replace('_', ' ')}" for i, a in enumerate(actions))
+
+    @router.prefix("TOP ACTIONS")
+    def top_actions(user_id, query, rest):
+        if not motor():
+            return "Motor memory system not available"
+        actions = motor().most_frequent_actions(user_id, limit=int(rest) if rest.isdigit() else 5)
+        if not actions:
+            return "You haven't performed any actions yet."
+        return "Your most frequent actions:\n" + "\n".join(
+            f"{i + 1}. {a['action'].replace('_', ' ')} ({a['count']} times)" for i, a in enumerate(actions))
@@ -1,10 +1,17 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, Response, stream_with_context
 import os
 from neo4jbot import FamilyChatbot
 from dotenv import load_dotenv
 from datetime import datetime
 import json
 import re
+import atexit
+import time
+from time_series import TimeSeries
+from command_router import CommandRouter
+import motor_commands
+import sensor_commands
+from sensor_ingest import SensorIngest, parse_readings
 
 # Load environment variables
 load_dotenv()
@@ -12,22 +19,36 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "supersecretkey")
 
-# Initialize chatbot
+# Initialize chatbot; closed last at exit (atexit runs in reverse order), so
+# its write-behind queue and sensory consolidation are flushed on shutdown
 chatbot = FamilyChatbot()
+atexit.register(chatbot.close)
 
-# Temperature storage with thread safety
-from threading import Lock
+# Temperature readings with raw, per-minute and per-hour history
+temperature = TimeSeries(
+    "temperature",
+    path=os.getenv("TEMPERATURE_SERIES_FILE", "./sensor_data/temperature.jsonl")
+)
+atexit.register(temperature.flush)
 
-temp_lock = Lock()
-current_temp = None
-last_update = None
+# Bulk readings are applied by one background writer; the latest reading of
+# each applied batch becomes the shared AIML temperature
+sensor_ingest = SensorIngest(
+    temperature,
+    on_latest=lambda device, ts, temp: chatbot.set_shared_predicate("temperature", str(temp))
+)
+atexit.register(sensor_ingest.close)
+
+# Chat commands, matched before falling back to AIML
+router = CommandRouter()
+motor_commands.register(router, chatbot)
+sensor_commands.register(router, temperature)
 
 
 @app.before_request
 def before_request():
     if 'user_id' not in session:
-        session['user_id'] = f"guest_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        chatbot.set_user(session['user_id'])
+        session['user_id'] = f"guest_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
         session['conversation_id'] = str(datetime.now().timestamp())
 
 
@@ -54,7 +75,7 @@ def login():
                 'sensory': lambda: chatbot.memory.sensory.add_input(user_id, "login",
                                                                     f"User logged in at {datetime.now()}"),
                 'motor': lambda: chatbot.memory.motor.store_action(user_id, "login"),
-                'pam': lambda: chatbot.memory.pam.store_pam_analysis(user_id, {
+                'pam': lambda: chatbot.save_pam_analysis(user_id, {
                     'sentiment': {'label': 'neutral', 'polarity': 0},
                     'entities': [],
                     'pos_tags': [],
@@ -91,23 +112,11 @@ def get_bot_response():
         return jsonify({'response': "Hello! How can I help you today?"})
 
     try:
-        normalized_query = query.upper().strip()
-        motor_commands = {
-            "STORE GREETING": lambda: handle_motor_greeting(user_id, query),
-            "SHOW GREETINGS": lambda: handle_show_greetings(user_id),
-            "MOVE FORWARD": lambda: handle_motor_action(user_id, "move_forward"),
-            "PERFORM ACTION": lambda: handle_perform_action(user_id, query),
-            "HOW DO I WALK": lambda: handle_motor_action(user_id, "walk_instructions"),
-            "EXECUTE SEQUENCE": lambda: handle_execute_sequence(user_id, query),
-            "TEMPERATURE": lambda: handle_temperature_query()
-        }
-
-        for cmd_prefix, handler in motor_commands.items():
-            if normalized_query.startswith(cmd_prefix):
-                return handler()
-
-        # Process through AIML for non-motor queries
-        response = chatbot.process_query(query)
+        response = router.dispatch(user_id, query)
+        if response is None:
+            start = time.perf_counter()
+            response = chatbot.process_query(user_id, query)
+            router.record("aiml", (time.perf_counter() - start) * 1000)
         return jsonify({'response': str(response)})
 
     except Exception as e:
@@ -115,57 +124,66 @@ def get_bot_response():
         return jsonify({'response': "Sorry, I encountered an error processing your request."})
 
 
-# Motor command handlers
-def handle_motor_greeting(user_id, query):
-    greeting = query[len("STORE GREETING "):].strip()
-    if greeting and hasattr(chatbot.memory, 'motor'):
-        chatbot.memory.motor.store_greeting(user_id, greeting)
-        return jsonify({'response': "Got it. I'll store this greeting pattern in motor memory."})
-    return jsonify({'response': "Please provide a valid greeting to store."})
-
-
-def handle_show_greetings(user_id):
-    if hasattr(chatbot.memory, 'motor'):
-        greetings = chatbot.memory.motor.recall_greetings(user_id)
-        response = "I haven't learned any greetings yet."
-        if greetings:
-            response = "Here's what I've learned from motor memory:\n" + "\n".join(
-                f"{i + 1}. {g}" for i, g in enumerate(greetings))
-        return jsonify({'response': response})
-    return jsonify({'response': "Motor memory system not available"})
-
+def sse(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-def handle_motor_action(user_id, action):
-    if hasattr(chatbot.memory, 'motor'):
-        chatbot.memory.motor.store_action(user_id, action)
-    return jsonify({'response': f"Command acknowledged: {action.replace('_', ' ')}. Logged in motor memory."})
 
+@app.route("/stream")
+def stream_bot_response():
+    """Answer like /get, as Server-Sent Events.
 
-def handle_perform_action(user_id, query):
-    action = query[len("PERFORM ACTION "):].strip().lower()
-    if hasattr(chatbot.memory, 'motor'):
-        chatbot.memory.motor.store_action(user_id, f"perform_{action}")
-    return jsonify({'response': f"Initiating motor sequence for: {action}. Pattern stored."})
-
-
-def handle_execute_sequence(user_id, query):
-    sequence = query[len("EXECUTE SEQUENCE "):].strip().lower()
-    if hasattr(chatbot.memory, 'motor'):
-        chatbot.memory.motor.store_action(user_id, f"execute_{sequence}")
-    return jsonify({'response': f"Executing sequence: {sequence}. Referencing motor memory graph."})
+    Sends 'answer' and 'recall' events with parts of the reply as they are
+    produced, or 'failure' if answering fails, then 'done'; episodes are
+    saved after 'done' has been sent. ('error' is reserved by EventSource.)
+    """
+    user_id = session.get('user_id')
+    query = request.args.get('msg')
 
+    def generate():
+        if not user_id:
+            yield sse('answer', {'text': "Please login first"})
+        elif not query:
+            yield sse('answer', {'text': "Hello! How can I help you today?"})
+        else:
+            try:
+                response = router.dispatch(user_id, query)
+                if response is not None:
+                    yield sse('answer', {'text': str(response)})
+                else:
+                    start = time.perf_counter()
+                    parts = chatbot.stream_query(user_id, query)
+                    try:
+                        for kind, text in parts:
+                            if kind == 'done':
+                                router.record("aiml", (time.perf_counter() - start) * 1000)
+                                # The exchange is saved when the next part is
+                                # requested, after 'done' has been sent
+                                yield sse('done', {})
+                            else:
+                                yield sse(kind, {'text': text})
+                    finally:
+                        # Still save the exchange if the client disconnects
+                        parts.close()
+                    return
+            except Exception as e:
+                print(f"Error processing query '{query}': {str(e)}")
+                yield sse('failure', {'text': "Sorry, I encountered an error processing your request."})
+        yield sse('done', {})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route("/stats/commands")
+def command_stats():
+    return jsonify(router.stats())
 
-def handle_temperature_query():
-    with temp_lock:
-        if current_temp is not None:
-            return jsonify({'response': f"The current temperature is {current_temp}°C"})
-        return jsonify({'response': "Temperature data is currently unavailable"})
 
 ##########################################################################
 # Temperature endpoints
 @app.route('/update_sensor', methods=['POST'])
 def update_sensor():
-    global current_temp
     try:
         temp = None
 
@@ -180,10 +198,10 @@ def update_sensor():
             return jsonify({"error": "Temperature not provided"}), 400
 
         current_temp = float(temp)
+        temperature.add(current_temp)
 
-        # 🧠 Set temperature as AIML variable
-        if chatbot.current_user:
-            chatbot.k.setPredicate("temperature", str(current_temp), chatbot.current_user)
+        # 🧠 Set temperature as AIML variable for every session
+        chatbot.set_shared_predicate("temperature", str(current_temp))
 
         print(f"✅ Updated temperature: {current_temp}°C")
         return jsonify({"status": "success", "data_received": {"temp": current_temp}})
@@ -193,10 +211,35 @@ def update_sensor():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/update_sensor/batch', methods=['POST'])
+def update_sensor_batch():
+    """Accept a JSON array or newline-delimited JSON of readings
+    ({"device": ..., "temp": ..., "ts": ...}) and apply them asynchronously"""
+    try:
+        readings = parse_readings(request.get_data(), request.content_type)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid JSON: {e}"}), 400
+
+    accepted, errors, queued = sensor_ingest.submit(readings)
+    if not queued:
+        return jsonify({"error": "Ingestion queue is full, retry later"}), 503
+    return jsonify({
+        "status": "accepted",
+        "accepted": accepted,
+        "rejected": [{"index": index, "error": error} for index, error in errors[:100]],
+        "rejected_count": len(errors)
+    }), 202
+
+
+@app.route('/update_sensor/stats')
+def update_sensor_stats():
+    return jsonify(sensor_ingest.stats())
+
+
 
 ######################################################################
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5050, debug=True)
+    app.run(host="0.0.0.0", port=5050, debug=True, threaded=True)
 
 
 
@@ -6,14 +6,26 @@ from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 from pyswip import Prolog
-from neo4j import GraphDatabase
 import logging
+import threading
 from memory_system.episodic_memory import EpisodicMemory
 from memory_system.sensory_memory import SensoryMemory
 from memory_system.motor_memory import MotorMemory
 from memory_system.pam_memory import PAMMemory
 from memory_system.semantic_memory import SemanticMemory
 from memory_system.social_memory import SocialMemory
+from memory_system.nlp_service import NLPService
+from memory_system.kinship_graph import KinshipGraph
+from memory_system.connection import Neo4jConnection
+from memory_system.migrations import SchemaMigrator
+from memory_system.user_log import UserLog
+from memory_system.write_behind import WriteBehindQueue
+from kernel_pool import KernelPool, SessionTable, respond_in_session
+from brain_cache import BrainCache
+from response_cache import ResponseCache
+from kinship_index import KinshipIndex
+from relation_router import RelationRouter
+from prolog_service import PrologService
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,17 +34,45 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+RECALL_TAG = re.compile(r"<memory_recall>(.*?)</memory_recall>", re.IGNORECASE)
+
 
 class FamilyChatbot:
-    def __init__(self):
+    def __init__(self, write_behind=None):
         self.BRAIN_FILE = "./pretrained_model/aiml_pretrained_model.dump"
         self.k= aiml.Kernel()
+        self.brain_cache = BrainCache(
+            learn_list="./pretrained_model/learningFileList.aiml",
+            brain_file=self.BRAIN_FILE,
+            cache_dir="./pretrained_model/cache"
+        )
+        self.response_cache = ResponseCache(int(os.getenv("RESPONSE_CACHE_SIZE", 2048)))
+        self.aiml_sessions = SessionTable(
+            max_sessions=int(os.getenv("AIML_MAX_SESSIONS", 10000)),
+            ttl=float(os.getenv("AIML_SESSION_TTL", 3600))
+        )
+        self.kernel_pool = None
         self.user_log_dir = "./user_logs"
-        os.makedirs(self.user_log_dir, exist_ok=True)
-        self.current_user = None
+        self.user_log = UserLog(
+            self.user_log_dir,
+            max_bytes=int(os.getenv("USER_LOG_MAX_BYTES", 5 * 1024 * 1024)),
+            compress=os.getenv("USER_LOG_COMPRESS", "true").lower() == "true"
+        )
+        self.user_log.migrate_all()
         self.prolog = None
-        self.driver = None
+        self.prolog_service = None
+        self._prolog_lock = threading.RLock()
+        self.kinship_index = KinshipIndex()
+        self.relation_router = RelationRouter([])
+        self._shared_predicates = {}
+        self.kinship_sync = os.getenv("KINSHIP_GRAPH_SYNC", "false").lower() == "true"
+        self.db = None
         self.memory = None
+        self.nlp = None
+        if write_behind is None:
+            write_behind = os.getenv("WRITE_BEHIND", "false").lower() == "true"
+        self.write_behind = write_behind
+        self.persist_queue = None
 
         self._initialize_components()
 
@@ -48,129 +88,167 @@ class FamilyChatbot:
         self._initialize_memories()
 
     def _initialize_aiml(self):
-        if os.path.exists(self.BRAIN_FILE):
-            logger.info("Loading brain from dump file...")
-            self.k.loadBrain(self.BRAIN_FILE)
-            if hasattr(self.k, '_categories'):
-                logger.info(f"Brain loaded with {len(self.k._categories)} categories")
-            elif hasattr(self.k, 'num_categories'):
-                logger.info(f"Brain loaded with {self.k.num_categories} categories")
-            else:
-                logger.info("Brain loaded successfully")
+        result = self.brain_cache.load(self.k)
+        if result['status'] == 'hit':
+            logger.info(f"Brain cache hit: loaded {result['categories']} categories "
+                        f"in {result['seconds']:.2f}s")
         else:
-            logger.info("Bootstrapping AIML kernel from scratch...")
-            aiml_files = [
-                "./pretrained_model/learningFileList.aiml",
-                "./data/conversation.aiml",
-                "./data/ai.aiml",
-                "./data/food.aiml",
-                "./data/knowledge.aiml",
-                "./data/user_dob_facts.aiml",
-                "./data/user_gender_facts.aiml",
-                "./data/user_married_facts.aiml",
-                "./data/user_query.aiml",
-                "./data/user_relations_facts.aiml",
-                "./data/words.aiml",
-                "./data/sensory.aiml",
-                "./data/semantic.aiml",
-                "./data/pam.aiml",
-                "./data/motor.aiml",
-                "./ data/temperature.aiml"
-                "./data/episodic.aiml"
-            ]
-            self.k.bootstrap(learnFiles=aiml_files, commands="load aiml")
-            self.k.saveBrain(self.BRAIN_FILE)
-            if hasattr(self.k, '_categories'):
-                logger.info(f"Brain created with {len(self.k._categories)} categories")
-            elif hasattr(self.k, 'num_categories'):
-                logger.info(f"Brain created with {self.k.num_categories} categories")
-            else:
-                logger.info("Brain created and saved successfully")
+            logger.info(f"Brain cache miss: recompiled {len(result['compiled'])} changed files "
+                        f"{result['compiled']}, built {result['categories']} categories "
+                        f"in {result['seconds']:.2f}s")
+        self.response_cache.rebuild(self.k)
+
+        workers = int(os.getenv("AIML_WORKERS", 0))
+        if workers > 0:
+            # Fork before Prolog, Neo4j and spaCy start threads or load models
+            try:
+                self.kernel_pool = KernelPool(self.k, workers, cache=self.response_cache,
+                                              sessions=self.aiml_sessions)
+            except ValueError as e:
+                logger.warning(f"AIML worker pool unavailable, using in-process kernel: {e}")
 
     def _initialize_prolog(self):
         try:
-            path = Path("data/family.pl").absolute()
-            path_str = str(path).replace('\\', '/')
-            self.prolog = Prolog()
-            list(self.prolog.query(f"consult('{path_str}')"))
+            workers = int(os.getenv("PROLOG_WORKERS", 0))
+            if workers > 0:
+                path_str = self._prolog_path("data/family.pl")
+                self.prolog_service = PrologService(
+                    path_str,
+                    workers=workers,
+                    timeout=float(os.getenv("PROLOG_TIMEOUT", 5.0))
+                )
+                self._rebuild_kinship_index(path_str)
+            else:
+                self.prolog = Prolog()
+                self.consult("data/family.pl")
             logger.info("Prolog knowledge base initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Prolog: {e}")
             self.prolog = None
+            self.prolog_service = None
 
     def _initialize_memories(self):
         try:
-            uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-            user = os.getenv("NEO4J_USER", "neo4j")
-            password = os.getenv("NEO4J_PASS", "admin@123")
+            logger.info(f"Connecting to Neo4j at {os.getenv('NEO4J_URI', 'bolt://localhost:7687')}...")
+            # The one connection shared by, and closed on behalf of, every memory system
+            self.db = Neo4jConnection.from_env()
+            if self.db.verify():
+                logger.info("Neo4j connection verified")
 
-            logger.info(f"Connecting to Neo4j at {uri}...")
-            self.driver = GraphDatabase.driver(uri, auth=(user, password))
+            # A single version read when the schema is current
+            logger.info(f"Neo4j schema at version {SchemaMigrator(self.db).migrate()}")
 
-            with self.driver.session() as session:
-                result = session.run("RETURN 1 AS test")
-                if result.single()[0] == 1:
-                    logger.info("Neo4j connection verified")
+            # One spaCy model and analysis cache shared by every memory system
+            self.nlp = NLPService()
 
             self.memory = type("Memory", (), {})()
-            self.memory.episodic = EpisodicMemory(self.driver)
-            self.memory.pam = PAMMemory(self.driver)
-            self.memory.sensory = SensoryMemory(self.driver)
-            self.memory.motor = MotorMemory(self.driver)
-            self.memory.semantic = SemanticMemory(self.driver)
-            self.memory.social = SocialMemory(self.driver)
+            self.memory.episodic = EpisodicMemory(self.db, nlp_service=self.nlp)
+            self.memory.pam = PAMMemory(self.db, nlp_service=self.nlp)
+            # Consolidated in the background; close() flushes it
+            self.memory.sensory = SensoryMemory(self.db, consolidate=True)
+            self.memory.motor = MotorMemory(self.db)
+            self.memory.semantic = SemanticMemory(self.db)
+            self.memory.social = SocialMemory(self.db)
+            self.memory.kinship = KinshipGraph(self.db)
+            if self.kinship_sync:
+                self.memory.kinship.load_file("data/family.pl")
+
+            if self.write_behind:
+                self.persist_queue = WriteBehindQueue(
+                    self._persist_batch,
+                    max_size=int(os.getenv("WRITE_BEHIND_MAX_SIZE", 1000)),
+                    batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 50)),
+                    flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", 0.5)),
+                    name="memory-writer"
+                )
 
             logger.info("All memory systems initialized successfully")
         except Exception as e:
             logger.error(f"Memory system initialization failed: {e}")
-            if hasattr(self, 'driver') and self.driver:
-                self.driver.close()
+            if self.db:
+                self.db.close()
             raise
 
-    def _get_user_log_path(self, user_id):
-        return os.path.join(self.user_log_dir, f"{user_id}_log.json")
+    def save_to_episodic_memory(self, user_id, message, role, timestamp=None):
+        """Dual storage in JSON lines and Neo4j"""
+        timestamp = timestamp or datetime.now().isoformat()
 
-    def save_to_episodic_memory(self, user_id, message, role):
-        """Dual storage in JSON and Neo4j"""
-        # JSON log
-        log_path = self._get_user_log_path(user_id)
+        # JSON lines log
         try:
-            log = []
-            if os.path.exists(log_path):
-                with open(log_path, 'r') as f:
-                    log = json.load(f)
-
-            entry = {
-                "timestamp": datetime.now().isoformat(),
+            self.user_log.append(user_id, {
+                "timestamp": timestamp,
                 "role": role,
                 "message": message
-            }
-            log.append(entry)
-
-            with open(log_path, 'w') as f:
-                json.dump(log, f, indent=2)
+            })
         except Exception as e:
             logger.error(f"Failed to save to JSON log: {e}")
 
         # Neo4j storage
-        try:
-            sentiment = None
-            if role == "user" and hasattr(self.memory, 'pam'):
-                sentiment_result = self.memory.pam.analyze_text(message)
-                sentiment = sentiment_result.get('sentiment', {})
-                sentiment = json.dumps(sentiment) if sentiment else None
-
-            self.memory.episodic.record_interaction(
-                user_id=user_id,
-                utterance=message,
-                role=role,
-                sentiment=sentiment
-            )
-        except Exception as e:
-            logger.error(f"Failed to save to episodic memory: {e}")
+        self._persist({
+            'kind': 'episode',
+            'user_id': user_id,
+            'message': message,
+            'role': role,
+            'timestamp': timestamp
+        })
+
+    def save_pam_analysis(self, user_id, analysis):
+        """Store a PAM analysis, deferred when write-behind mode is on"""
+        self._persist({
+            'kind': 'pam',
+            'user_id': user_id,
+            'analysis': analysis
+        })
+
+    def _persist(self, item):
+        """Hand a write to the write-behind queue or perform it inline"""
+        if self.persist_queue and self.persist_queue.submit(item):
+            return
+        self._persist_batch([item])
+
+    def _persist_batch(self, items):
+        """Apply a batch of episode and PAM writes to Neo4j"""
+        episodes = [item for item in items if item['kind'] == 'episode']
+        if episodes:
+            try:
+                interactions = []
+                for item in episodes:
+                    sentiment = None
+                    if item['role'] == "user" and hasattr(self.memory, 'pam'):
+                        sentiment_result = self.memory.pam.analyze_text(item['message'])
+                        sentiment = sentiment_result.get('sentiment', {})
+                        sentiment = json.dumps(sentiment) if sentiment else None
+
+                    interactions.append({
+                        'user_id': item['user_id'],
+                        'utterance': item['message'],
+                        'role': item['role'],
+                        'sentiment': sentiment,
+                        'timestamp': item['timestamp']
+                    })
+                self.memory.episodic.record_interactions(interactions)
+            except Exception as e:
+                logger.error(f"Failed to save to episodic memory: {e}")
+
+        analyses = [(item['user_id'], item['analysis']) for item in items if item['kind'] == 'pam']
+        if analyses:
+            try:
+                self.memory.pam.store_pam_analyses(analyses)
+            except Exception as e:
+                logger.error(f"Failed to store PAM analysis: {e}")
+
+    def persistence_stats(self):
+        """Write-behind queue metrics, if enabled, and Neo4j pool utilization"""
+        return {
+            'queue': self.persist_queue.stats() if self.persist_queue else None,
+            'neo4j': self.db.stats() if self.db else None
+        }
 
     def set_user(self, user_id):
-        self.current_user = user_id
+        """Warm the recent-episode buffer for a user starting a session.
+
+        The bot keeps no current user; every query names its user explicitly.
+        """
         try:
             memories = self.memory.episodic.recall_recent(user_id, 3)
             if memories:
@@ -181,92 +259,159 @@ class FamilyChatbot:
         except Exception as e:
             logger.error(f"Failed to recall memories: {e}")
 
-    def process_query(self, user_query):
-        if not user_query.strip():
-            return "Please say something."
-
-        if self.current_user:
-            self.save_to_episodic_memory(self.current_user, user_query, "user")
+    def set_shared_predicate(self, name, value):
+        """Set an AIML predicate for every user session, e.g. sensor readings"""
+        self._shared_predicates[name] = value
 
-        aiml_response = self.k.respond(user_query)
-
-        # Enhanced memory recall handling
-        if "<memory_recall>" in aiml_response.lower():
+    def _respond(self, user_id, user_query):
+        """Run the AIML kernel in the user's own predicate session"""
+        session_id = user_id or "_global"
+        predicates = dict(self._shared_predicates)
+        if self.kernel_pool:
             try:
-                recall_cmd = re.search(r"<memory_recall>(.*?)</memory_recall>", aiml_response, re.IGNORECASE).group(
-                    1).strip()
-
-                # Handle different recall command formats
-                if recall_cmd.lower().startswith("last"):
-                    try:
-                        limit = int(recall_cmd.split()[-1])
-                        memories = self.memory.episodic.recall_recent(self.current_user,
-                                                                      limit) if self.current_user else []
-                    except (ValueError, IndexError):
-                        memories = self.memory.episodic.recall_recent(self.current_user, 5) if self.current_user else []
-                else:
-                    memories = self.memory.episodic.recall_related(self.current_user, recall_cmd,
-                                                                   5) if self.current_user else []
-
-                # Format the response based on the original AIML template
-                if "Here's our recent conversation history:" in aiml_response:
-                    # Format for "TELL ME WHAT WE DISCUSSED" pattern
-                    if memories:
-                        memory_list = []
-                        for mem in memories:
-                            prefix = "You" if mem['role'] == "user" else "Bot"
-                            memory_list.append(f"{prefix}: {mem['message']}")
-                        memory_text = "\n".join(memory_list)
-                    else:
-                        memory_text = "I don't have any recent conversations to recall."
-                else:
-                    # Default format for other memory recall patterns
-                    if memories:
-                        memory_list = []
-                        for i, memory in enumerate(memories, 1):
-                            prefix = "You" if memory['role'] == "user" else "I"
-                            memory_list.append(f"{i}. {prefix} said: {memory['message']}")
-                        memory_text = "\n".join(memory_list)
-                    else:
-                        memory_text = "I don't have any memories about that."
-
-                aiml_response = re.sub(
-                    r"<memory_recall>.*?</memory_recall>",
-                    memory_text,
-                    aiml_response,
-                    flags=re.IGNORECASE
-                )
-            except Exception as e:
-                logger.error(f"Memory recall failed: {e}")
-                aiml_response = re.sub(
-                    r"<memory_recall>.*?</memory_recall>",
-                    "I had trouble accessing my memories.",
-                    aiml_response,
-                    flags=re.IGNORECASE
-                )
+                return self.kernel_pool.respond(user_query, session_id, predicates)
+            except RuntimeError as e:
+                logger.error(f"{e}; answering in-process")
+        return respond_in_session(self.k, user_query, session_id, predicates,
+                                  cache=self.response_cache, sessions=self.aiml_sessions)
+
+    def process_query(self, user_id, user_query):
+        """Answer a query on behalf of the given user.
+
+        Args:
+            user_id: ID of the user asking; also the AIML session ID
+            user_query: The user's message
+
+        Returns:
+            The bot's response text
+        """
+        return "".join(text for _, text in self.stream_query(user_id, user_query))
+
+    def stream_query(self, user_id, user_query):
+        """Answer a query as a sequence of response parts.
+
+        The AIML or Prolog answer is yielded as soon as it is produced and
+        each memory recall expansion follows as its own part. Both sides of
+        the exchange are saved to episodic memory after the final 'done'
+        part has been consumed, or when the consumer stops early.
+
+        Args:
+            user_id: ID of the user asking; also the AIML session ID
+            user_query: The user's message
+
+        Yields:
+            Tuples (kind, text), kind being 'answer', 'recall' or a last
+            'done' with empty text; the texts joined are the full response
+        """
+        if not user_query.strip():
+            yield 'answer', "Please say something."
+            return
 
-        if not aiml_response.strip() or "is the" in aiml_response:
-            match = re.match(r"who is (?:the )?(father|mother|parent|son|daughter) of ([a-zA-Z]+)", user_query.lower())
-            if match:
-                relation, person = match.groups()
-                names = self.query_prolog(f"{relation}_of", person)
-                if names:
-                    aiml_response = f"{names[0]} is the {relation} of {person.capitalize()}." if len(names) == 1 else \
-                        f"The {relation} of {person.capitalize()} could be: {', '.join(names)}"
-                else:
-                    aiml_response = f"I don't know who the {relation} of {person.capitalize()} is."
+        asked_at = datetime.now().isoformat()
+        reply = []
+        try:
+            # Kinship questions are answered by Prolog without walking the AIML graph
+            route = self.relation_router.match(user_query)
+            if route:
+                relation, person = route
+                aiml_response = RelationRouter.answer(relation, person, self.query_prolog(relation, person))
+            else:
+                aiml_response = self._respond(user_id, user_query)
+
+            position = 0
+            for match in RECALL_TAG.finditer(aiml_response):
+                if match.start() > position:
+                    reply.append(aiml_response[position:match.start()])
+                    yield 'answer', reply[-1]
+                reply.append(self._recall(user_id, match.group(1).strip(), aiml_response))
+                yield 'recall', reply[-1]
+                position = match.end()
+            if position < len(aiml_response) or not reply:
+                reply.append(aiml_response[position:])
+                yield 'answer', reply[-1]
+            yield 'done', ""
+        finally:
+            if user_id:
+                self.save_to_episodic_memory(user_id, user_query, "user", timestamp=asked_at)
+                if reply:
+                    self.save_to_episodic_memory(user_id, "".join(reply), "bot")
+
+    def _recall(self, user_id, recall_cmd, aiml_response):
+        """Expand a <memory_recall> command of an AIML template"""
+        try:
+            # Handle different recall command formats
+            if recall_cmd.lower().startswith("last"):
+                try:
+                    limit = int(recall_cmd.split()[-1])
+                    memories = self.memory.episodic.recall_recent(user_id, limit) if user_id else []
+                except (ValueError, IndexError):
+                    memories = self.memory.episodic.recall_recent(user_id, 5) if user_id else []
+            else:
+                memories = self.memory.episodic.recall_related(user_id, recall_cmd, 5) if user_id else []
+
+            # Format the response based on the original AIML template
+            if "Here's our recent conversation history:" in aiml_response:
+                # Format for "TELL ME WHAT WE DISCUSSED" pattern
+                if memories:
+                    memory_list = []
+                    for mem in memories:
+                        prefix = "You" if mem['role'] == "user" else "Bot"
+                        memory_list.append(f"{prefix}: {mem['message']}")
+                    return "\n".join(memory_list)
+                return "I don't have any recent conversations to recall."
+
+            # Default format for other memory recall patterns
+            if memories:
+                memory_list = []
+                for i, memory in enumerate(memories, 1):
+                    prefix = "You" if memory['role'] == "user" else "I"
+                    memory_list.append(f"{i}. {prefix} said: {memory['message']}")
+                return "\n".join(memory_list)
+            return "I don't have any memories about that."
+        except Exception as e:
+            logger.error(f"Memory recall failed: {e}")
+            return "I had trouble accessing my memories."
+
+    @staticmethod
+    def _prolog_path(pl_file):
+        return str(Path(pl_file).absolute()).replace('\\', '/')
+
+    def consult(self, pl_file):
+        """(Re-)consult a Prolog file and rebuild the kinship index from it"""
+        path_str = self._prolog_path(pl_file)
+        if self.prolog_service:
+            self.prolog_service.reload(path_str)
+            self._rebuild_kinship_index(path_str)
+        else:
+            with self._prolog_lock:
+                list(self.prolog.query(f"consult('{path_str}')"))
+                self._rebuild_kinship_index(path_str)
 
-        if self.current_user:
-            self.save_to_episodic_memory(self.current_user, aiml_response, "bot")
+        if self.kinship_sync and self.memory:
+            self.memory.kinship.load_file(pl_file)
 
-        return aiml_response
+    def _rebuild_kinship_index(self, path_str):
+        query_batch = self.prolog_service.query_batch if self.prolog_service else None
+        self.kinship_index.rebuild(self._run_prolog, path_str, query_batch=query_batch)
+        self.relation_router = RelationRouter(self.kinship_index.predicates)
+
+    def _run_prolog(self, goal):
+        if self.prolog_service:
+            return self.prolog_service.query(goal)
+        # The embedded SWI-Prolog engine must not be entered from two threads
+        with self._prolog_lock:
+            return list(self.prolog.query(goal))
 
     def query_prolog(self, relation, person):
-        if not self.prolog:
+        if not self.prolog and not self.prolog_service:
             return None
         try:
+            materialized, answers = self.kinship_index.lookup(relation, person.lower())
+            if materialized:
+                return [answer.capitalize() for answer in answers] if answers else None
+
             query = f"{relation}(X, {person.lower()})"
-            results = list(self.prolog.query(query))
+            results = self._run_prolog(query)
             return [result['X'].capitalize() for result in results] if results else None
         except Exception as e:
             logger.error(f"Prolog query failed: {e}")
@@ -274,17 +419,21 @@ class FamilyChatbot:
 
     def close(self):
         try:
-            if hasattr(self, 'memory'):
-                for component in ['episodic', 'pam', 'sensory', 'motor', 'semantic', 'social']:
-                    if hasattr(self.memory, component):
-                        try:
-                            getattr(self.memory, component).close()
-                        except Exception as e:
-                            logger.error(f"Error closing {component}: {e}")
-
-            if hasattr(self, 'driver') and self.driver:
-                self.driver.close()
-                logger.info("Neo4j driver closed")
+            if self.persist_queue:
+                self.persist_queue.close(timeout=30)
+                logger.info(f"Write-behind queue flushed: {self.persist_queue.stats()}")
+
+            if self.kernel_pool:
+                self.kernel_pool.close()
+
+            if self.memory and hasattr(self.memory, 'sensory'):
+                self.memory.sensory.close()
+
+            if self.db:
+                self.db.close()
+
+            if self.prolog_service:
+                self.prolog_service.close()
 
             if hasattr(self, 'prolog'):
                 del self.prolog
@@ -314,7 +463,7 @@ if __name__ == "__main__":
                     if query.lower() == "exit":
                         break
 
-                    response = bot.process_query(query)
+                    response = bot.process_query(user_id, query)
                     print("Bot:", response)
 
                 except KeyboardInterrupt:
@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PrologServiceError(Exception):
+    """A goal failed, timed out or its worker crashed"""
+
+
+def _encode(value):
+    """Make a pyswip value JSON-safe; only atoms come back as strings"""
+    if isinstance(value, (str, int, float)):
+        return value
+    if type(value).__name__ == "Variable":
+        return None
+    return {'term': str(value)}
+
+
+def _worker_main(kb_path):
+    """Serve goal batches on stdin, one JSON result line per goal on stdout"""
+    # Keep the protocol stream private and send anything Prolog prints to stderr
+    protocol = os.fdopen(os.dup(1), 'w')
+    os.dup2(2, 1)
+
+    from pyswip import Prolog
+    prolog = Prolog()
+    list(prolog.query(f"consult('{kb_path}')"))
+    protocol.write(json.dumps({'ready': True}) + "\n")
+    protocol.flush()
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        for goal in request['goals']:
+            try:
+                solutions = [{name: _encode(value) for name, value in solution.items()}
+                             for solution in prolog.query(goal)]
+                result = {'ok': True, 'solutions': solutions}
+            except Exception as e:
+                result = {'ok': False, 'error': str(e)}
+            protocol.write(json.dumps(result) + "\n")
+            protocol.flush()
+
+
+class _PrologWorker:
+    """One SWI-Prolog process speaking JSON lines over its stdin/stdout"""
+
+    def __init__(self, kb_path, name, startup_timeout=30.0):
+        self.kb_path = kb_path
+        self.name = name
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self._start()
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", self.kb_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1
+        )
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read, args=(self.process, self._lines),
+                         name=f"{self.name}-reader", daemon=True).start()
+
+        try:
+            ready = self._lines.get(timeout=self.startup_timeout)
+        except queue.Empty:
+            ready = None
+        if ready is None:
+            self.stop()
+            raise PrologServiceError(f"{self.name} failed to start")
+        logger.debug(f"{self.name} started (pid {self.process.pid})")
+
+    @staticmethod
+    def _read(process, lines):
+        for line in process.stdout:
+            lines.put(line)
+        lines.put(None)
+
+    def restart(self):
+        self.stop()
+        self._start()
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def run(self, goals, timeout):
+        """Run goals in order; a timeout or crash restarts the process and
+        the remaining goals are resubmitted to the new one"""
+        results = []
+        pending = list(goals)
+        while pending:
+            try:
+                self.process.stdin.write(json.dumps({'goals': pending}) + "\n")
+                self.process.stdin.flush()
+            except OSError:
+                self.restart()
+                continue
+
+            while pending:
+                goal = pending.pop(0)
+                try:
+                    line = self._lines.get(timeout=timeout)
+                except queue.Empty:
+                    line = None
+                    error = f"Goal timed out after {timeout}s: {goal}"
+                else:
+                    error = f"{self.name} crashed while running: {goal}"
+
+                if line is None:
+                    logger.error(error)
+                    results.append({'ok': False, 'error': error})
+                    self.restart()
+                    break
+                results.append(json.loads(line))
+        return results
+
+
+class PrologService:
+    """Pool of out-of-process Prolog reasoners with batched queries.
+
+    Each worker consults the knowledge base on start. Workers are checked
+    out one caller at a time, so the service can be used from any number of
+    threads, and a crash or runaway query only costs a worker restart.
+    """
+
+    def __init__(self, kb_path, workers=1, timeout=5.0):
+        """Start the worker processes.
+
+        Args:
+            kb_path: Absolute path of the .pl file to consult
+            workers: Number of Prolog processes
+            timeout: Default per-goal timeout in seconds
+        """
+        self.kb_path = kb_path
+        self.timeout = timeout
+        self._workers = []
+        try:
+            for i in range(workers):
+                self._workers.append(_PrologWorker(kb_path, f"prolog-worker-{i}"))
+        except Exception:
+            # Do not leak the workers that did start
+            self.close()
+            raise
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+        logger.info(f"Started {workers} Prolog workers for {kb_path}")
+
+    def query_batch(self, goals, timeout=None):
+        """Run several goals in one round trip.
+
+        Args:
+            goals: List of goal strings
+            timeout: Per-goal timeout in seconds, defaults to the service's
+
+        Returns:
+            One dictionary per goal with 'ok' and either 'solutions' (list of
+            variable bindings) or 'error'
+        """
+        if not goals:
+            return []
+        worker = self._idle.get()
+        try:
+            return worker.run(goals, timeout or self.timeout)
+        finally:
+            self._idle.put(worker)
+
+    def query(self, goal, timeout=None):
+        """Run a single goal and return its solutions.
+
+        Raises:
+            PrologServiceError: If the goal raised, timed out or crashed
+        """
+        result = self.query_batch([goal], timeout)[0]
+        if not result['ok']:
+            raise PrologServiceError(result['error'])
+        return result['solutions']
+
+    def reload(self, kb_path=None):
+        """Restart every worker so it re-consults the knowledge base.
+
+        Args:
+            kb_path: Optional new .pl file to consult instead
+        """
+        workers = [self._idle.get() for _ in self._workers]
+        try:
+            if kb_path:
+                self.kb_path = kb_path
+            for worker in workers:
+                worker.kb_path = self.kb_path
+                worker.restart()
+        finally:
+            for worker in workers:
+                self._idle.put(worker)
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+        logger.info("Prolog workers stopped")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--worker":
+        _worker_main(sys.argv[2])
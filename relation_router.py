@@ -0,0 +1,75 @@
+import re
+
+IRREGULAR_PLURALS = {'child': 'children', 'grandchild': 'grandchildren'}
+
+
+class RelationRouter:
+    """Single-pass matcher from kinship questions to Prolog relation goals.
+
+    The matcher is generated from the predicate names of the loaded
+    knowledge base: ``<noun>_of`` answers "who is the <noun> of X" (and the
+    plural "who are the <nouns> of X"), ``<verb>_to`` answers
+    "who is <verb> to X".
+    """
+
+    def __init__(self, predicates):
+        """
+        Args:
+            predicates: Names of binary predicates, e.g. KinshipIndex.predicates
+        """
+        self.phrases = {}
+        for name in predicates:
+            if name.endswith("_of"):
+                noun = name[:-len("_of")].replace("_", " ")
+                self.phrases[f"{noun} of"] = name
+                if " " not in noun:
+                    plural = IRREGULAR_PLURALS.get(noun, noun + "s")
+                    self.phrases[f"{plural} of"] = name
+            elif name.endswith("_to"):
+                self.phrases[name.replace("_", " ")] = name
+
+        self._pattern = None
+        if self.phrases:
+            # Longest phrases first so "grandfather of" wins over "father of"
+            alternation = "|".join(
+                r"[\s-]+".join(map(re.escape, phrase.split()))
+                for phrase in sorted(self.phrases, key=len, reverse=True)
+            )
+            self._pattern = re.compile(
+                rf"^\s*(?:who|what)\s+(?:is|are|was|were)\s+(?:the\s+|an?\s+)?"
+                rf"(?P<phrase>{alternation})\s+(?P<person>[a-z]+)\s*[?.!]*\s*$",
+                re.IGNORECASE
+            )
+
+    def match(self, text):
+        """Map an utterance to a relation goal.
+
+        Returns:
+            Tuple (predicate, person) with person lower-cased, or None
+        """
+        if not self._pattern:
+            return None
+        match = self._pattern.match(text)
+        if not match:
+            return None
+        phrase = " ".join(re.split(r"[\s-]+", match.group("phrase").lower()))
+        return self.phrases[phrase], match.group("person").lower()
+
+    @staticmethod
+    def answer(predicate, person, names):
+        """Phrase the answer to relation(X, person) given its solutions"""
+        person = person.capitalize()
+        if predicate.endswith("_of"):
+            relation = predicate[:-len("_of")].replace("_", " ")
+            if not names:
+                return f"I don't know who the {relation} of {person} is."
+            if len(names) == 1:
+                return f"{names[0]} is the {relation} of {person}."
+            return f"The {relation} of {person} could be: {', '.join(names)}"
+
+        relation = predicate.replace("_", " ")
+        if not names:
+            return f"I don't know who is {relation} {person}."
+        if len(names) == 1:
+            return f"{names[0]} is {relation} {person}."
+        return f"{', '.join(names)} are {relation} {person}."
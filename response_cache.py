@@ -0,0 +1,158 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+from aiml import Utils
+
+logger = logging.getLogger(__name__)
+
+# Template elements whose output depends only on the matched input
+PURE_ELEMENTS = {
+    'template', 'text', 'star', 'uppercase', 'lowercase', 'formal',
+    'sentence', 'person', 'person2', 'gender', 'version'
+}
+
+TEMPLATE_KEY = 2  # PatternMgr._TEMPLATE
+WILDCARD_KEYS = (0, 1)  # PatternMgr._UNDERSCORE, PatternMgr._STAR
+CONTEXT_KEYS = (3, 4)  # PatternMgr._THAT, PatternMgr._TOPIC
+
+
+def is_pure(elem):
+    """True if an AIML template element uses no session state or randomness"""
+    if elem[0] not in PURE_ELEMENTS:
+        return False
+    return all(is_pure(child) for child in elem[2:] if isinstance(child, list))
+
+
+class ResponseCache:
+    """LRU cache of responses produced by pure AIML categories.
+
+    Categories are classified when the brain is loaded. At respond time the
+    input is matched against the brain with the session's real that/topic;
+    only when that match is a pure template is the cached response served,
+    bypassing Kernel.respond while still updating the session history.
+    """
+
+    def __init__(self, max_size=2048):
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._pure = set()
+        self._contextual = set()
+        self._signature = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+
+    def rebuild(self, kernel):
+        """Classify every category of the kernel's brain and clear the cache"""
+        pure = set()
+        contextual = set()
+        total = 0
+        # Every learned category has a <that> and <topic>, "*" by default; a
+        # template whose that/topic has other words is only matched in context
+        stack = [(kernel._brain._root, False, False)]
+        while stack:
+            node, in_context, literal = stack.pop()
+            for key, value in node.items():
+                if key == TEMPLATE_KEY:
+                    total += 1
+                    if is_pure(value):
+                        pure.add(id(value))
+                        if literal:
+                            contextual.add(id(value))
+                elif isinstance(value, dict):
+                    stack.append((
+                        value,
+                        in_context or key in CONTEXT_KEYS,
+                        literal or (in_context and key not in WILDCARD_KEYS + CONTEXT_KEYS)
+                    ))
+
+        with self._lock:
+            self._pure = pure
+            self._contextual = contextual
+            self._cache.clear()
+            self._signature = self._brain_signature(kernel)
+        logger.info(f"Response cache: {len(pure)} of {total} categories are pure")
+
+    def _brain_signature(self, kernel):
+        return id(kernel._brain), kernel.numCategories()
+
+    def _normalize(self, kernel, text):
+        normalized = kernel._subbers['normal'].sub(text).upper()
+        return " ".join(re.sub(kernel._brain._puncStripRE, " ", normalized).split())
+
+    def _key(self, kernel, template, sentence, that, topic):
+        # The same input matches different categories depending on <that> and
+        # <topic>, so the matched template is part of the key, and so is the
+        # context of categories that have a <that> or <topic>
+        if id(template) not in self._contextual:
+            that = topic = ""
+        return (id(template), self._normalize(kernel, that), self._normalize(kernel, topic),
+                self._normalize(kernel, sentence))
+
+    def respond(self, kernel, text, session_id):
+        """Answer text like Kernel.respond, serving pure categories from cache"""
+        sentences = Utils.sentences(text)
+        if len(sentences) != 1:
+            return kernel.respond(text, session_id)
+        sentence = sentences[0]
+
+        with kernel._respondLock:
+            if self._signature != self._brain_signature(kernel):
+                # The brain was reloaded or learned new categories
+                self.rebuild(kernel)
+
+            kernel._addSession(session_id)
+            output_history = kernel.getPredicate(kernel._outputHistory, session_id)
+            that = output_history[-1] if output_history else ""
+            topic = kernel.getPredicate("topic", session_id)
+            template = kernel._brain.match(
+                kernel._subbers['normal'].sub(sentence),
+                kernel._subbers['normal'].sub(that),
+                kernel._subbers['normal'].sub(topic)
+            )
+            if template is None or id(template) not in self._pure:
+                with self._lock:
+                    self.uncacheable += 1
+                return kernel.respond(text, session_id)
+
+            key = self._key(kernel, template, sentence, that, topic)
+            with self._lock:
+                response = self._cache.get(key)
+                if response is not None:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+            if response is None:
+                response = kernel.respond(text, session_id)
+                with self._lock:
+                    self._cache[key] = response
+                    while len(self._cache) > self.max_size:
+                        self._cache.popitem(last=False)
+                return response
+
+            self._record_history(kernel, sentence, response, session_id)
+            return response
+
+    def _record_history(self, kernel, sentence, response, session_id):
+        """Keep <input>/<that> history as Kernel.respond would"""
+        for name, value in ((kernel._inputHistory, sentence), (kernel._outputHistory, response)):
+            history = kernel.getPredicate(name, session_id)
+            history.append(value)
+            while len(history) > kernel._maxHistorySize:
+                history.pop(0)
+            kernel.setPredicate(name, history, session_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._cache),
+                'pure_categories': len(self._pure),
+                'hits': self.hits,
+                'misses': self.misses,
+                'uncacheable': self.uncacheable
+            }
@@ -0,0 +1,52 @@
+import re
+
+# "... temperature ... in the last 2 hours", "... over the past day"
+TEMPERATURE_WINDOW = re.compile(
+    r"\btemperature\b.*\b(?:last|past)\s+(?:(\d+)\s+)?(second|minute|hour|day)s?\b",
+    re.IGNORECASE
+)
+WINDOW_SECONDS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def describe_trend(delta):
+    if abs(delta) < 0.1:
+        return "steady"
+    return f"{'rising' if delta > 0 else 'falling'} by {abs(delta):.1f}°C"
+
+
+def register(router, temperature):
+    """Register the temperature commands answered from a TimeSeries"""
+
+    @router.pattern(TEMPERATURE_WINDOW, "temperature_stats")
+    def temperature_stats(user_id, query, window):
+        count = int(window.group(1) or 1)
+        unit = window.group(2).lower()
+        period = f"{count} {unit}s" if count > 1 else unit
+        stats = temperature.summary(count * WINDOW_SECONDS[unit])
+        if not stats:
+            return f"I have no temperature readings from the last {period}."
+
+        query = query.lower()
+        if re.search(r"\b(average|avg|mean)\b", query):
+            return f"The average temperature over the last {period} was {stats['avg']:.1f}°C."
+        if re.search(r"\b(min|minimum|lowest|coldest)\b", query):
+            return f"The lowest temperature over the last {period} was {stats['min']:.1f}°C."
+        if re.search(r"\b(max|maximum|highest|warmest|hottest)\b", query):
+            return f"The highest temperature over the last {period} was {stats['max']:.1f}°C."
+        if re.search(r"\btrend\b", query):
+            return f"Over the last {period} the temperature was {describe_trend(stats['trend'])}."
+        return (f"Over the last {period} the temperature averaged {stats['avg']:.1f}°C, "
+                f"ranging from {stats['min']:.1f}°C to {stats['max']:.1f}°C, "
+                f"and was {describe_trend(stats['trend'])}.")
+
+    @router.prefix("TEMPERATURE")
+    def current_temperature(user_id, query, rest):
+        latest = temperature.latest()
+        if latest is None:
+            return "Temperature data is currently unavailable"
+        response = f"The current temperature is {latest[1]}°C"
+        stats = temperature.summary(3600)
+        if stats and stats['count'] > 1:
+            response += (f", averaging {stats['avg']:.1f}°C over the last hour "
+                         f"({describe_trend(stats['trend'])})")
+        return response
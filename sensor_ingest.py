@@ -0,0 +1,166 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+from memory_system.write_behind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+
+def parse_readings(body, content_type=None):
+    """Decode a request body holding one reading, a JSON array of readings or
+    newline-delimited JSON readings.
+
+    Raises:
+        ValueError: If the body is not valid JSON in any of these forms
+    """
+    text = body.decode('utf-8') if isinstance(body, bytes) else body
+    if content_type and 'ndjson' in content_type:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        # NDJSON sent without its content type
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return data if isinstance(data, list) else [data]
+
+
+def _timestamp(value, now):
+    if value is None:
+        return now
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Accept milliseconds from devices that send them
+        return value / 1000.0 if value > 1e11 else float(value)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
+
+# Seconds a device clock may run ahead before its readings are rejected
+MAX_SKEW = 300
+
+
+def validate_readings(readings, now=None, max_skew=MAX_SKEW):
+    """Validate a batch of readings column by column.
+
+    Each reading is a dictionary with 'temp', an optional 'device' id and an
+    optional 'ts' (epoch seconds or milliseconds, or ISO 8601). Readings
+    dated more than max_skew seconds in the future are rejected, since they
+    would move the time series' current buckets ahead of every real reading.
+
+    Returns:
+        Tuple (valid, errors): valid is a list of (device, timestamp, temp)
+        tuples, errors a list of (index, message)
+    """
+    now = time.time() if now is None else now
+    errors = []
+
+    # Extract the columns in one pass, then check each column as a whole
+    rows = [reading if isinstance(reading, dict) else {} for reading in readings]
+    temps = [row.get('temp') for row in rows]
+    devices = [str(row.get('device', 'default')) for row in rows]
+    stamps = [row.get('ts', row.get('timestamp')) for row in rows]
+
+    values = []
+    for index, temp in enumerate(temps):
+        try:
+            value = float(temp)
+            if value != value or not -100.0 <= value <= 150.0:
+                raise ValueError
+            values.append(value)
+        except (TypeError, ValueError):
+            values.append(None)
+            errors.append((index, f"invalid temp {temp!r}"))
+
+    times = []
+    for index, stamp in enumerate(stamps):
+        try:
+            ts = _timestamp(stamp, now)
+        except (TypeError, ValueError, OverflowError, OSError):
+            times.append(None)
+            errors.append((index, f"invalid timestamp {stamp!r}"))
+            continue
+        if ts > now + max_skew:
+            times.append(None)
+            errors.append((index, f"timestamp {stamp!r} is in the future"))
+        else:
+            times.append(ts)
+
+    valid = [(device, ts, value) for device, ts, value in zip(devices, times, values)
+             if value is not None and ts is not None]
+    return valid, sorted(errors)
+
+
+class SensorIngest:
+    """Accept reading batches on the request thread, apply them on one
+    background thread.
+
+    Requests only parse, validate and enqueue; a single writer folds queued
+    batches into the time series in timestamp order and reports the latest
+    reading to on_latest.
+    """
+
+    def __init__(self, series, on_latest=None, max_batches=1000, flush_interval=0.2, max_skew=MAX_SKEW):
+        """
+        Args:
+            series: TimeSeries the readings are added to
+            on_latest: Optional callable receiving (device, timestamp, temp)
+                whenever an applied batch holds a reading newer than any
+                before; late batches do not call it
+            max_batches: Maximum number of queued request batches
+            flush_interval: Maximum seconds a batch waits to be applied
+            max_skew: Seconds a reading may be dated in the future
+        """
+        self.series = series
+        self.max_skew = max_skew
+        self.on_latest = on_latest
+        self.latest_by_device = {}
+        self.latest = None
+        self.applied = 0
+        self._lock = threading.Lock()
+        self.queue = WriteBehindQueue(
+            self._apply,
+            max_size=max_batches,
+            batch_size=100,
+            flush_interval=flush_interval,
+            put_timeout=0,
+            name="sensor-ingest"
+        )
+
+    def submit(self, readings):
+        """Validate and enqueue readings.
+
+        Returns:
+            Tuple (accepted, errors, queued); queued is False when the queue
+            is full and nothing was accepted
+        """
+        valid, errors = validate_readings(readings, max_skew=self.max_skew)
+        if not valid:
+            return 0, errors, True
+        if not self.queue.submit(valid):
+            return 0, errors, False
+        return len(valid), errors, True
+
+    def _apply(self, batches):
+        readings = sorted((reading for batch in batches for reading in batch), key=lambda r: r[1])
+        for device, ts, value in readings:
+            self.series.add(value, ts)
+        newest = readings[-1]
+        with self._lock:
+            for device, ts, value in readings:
+                if device not in self.latest_by_device or ts >= self.latest_by_device[device][0]:
+                    self.latest_by_device[device] = (ts, value)
+            self.applied += len(readings)
+            advanced = self.latest is None or newest[1] >= self.latest[1]
+            if advanced:
+                self.latest = newest
+        if advanced and self.on_latest:
+            self.on_latest(*newest)
+
+    def stats(self):
+        with self._lock:
+            devices, applied = len(self.latest_by_device), self.applied
+        return dict(self.queue.stats(), devices=devices, readings=applied)
+
+    def close(self):
+        self.queue.close(timeout=10)
@@ -0,0 +1,88 @@
+"""Local load generator for the sensor endpoints.
+
+Posts the same synthetic readings once per request to /update_sensor and in
+batches to /update_sensor/batch, and prints readings/sec for both:
+
+    python sensor_server.py &
+    python sensor_loadgen.py --url http://localhost:5050 --readings 5000
+"""
+import argparse
+import json
+import random
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def make_readings(count, devices, seed=42):
+    rng = random.Random(seed)
+    start = time.time() - count
+    return [{'device': f"sensor-{i % devices}", 'temp': round(rng.uniform(18.0, 28.0), 2), 'ts': start + i}
+            for i in range(count)]
+
+
+def post(url, body, content_type):
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type}, method='POST')
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.status
+
+
+def applied_readings(base_url):
+    try:
+        with urllib.request.urlopen(f"{base_url}/update_sensor/stats", timeout=5) as response:
+            return json.load(response)['readings']
+    except Exception:
+        return None
+
+
+def run_single(base_url, readings, concurrency):
+    url = f"{base_url}/update_sensor"
+    bodies = [json.dumps({'temp': reading['temp']}).encode('utf-8') for reading in readings]
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda body: post(url, body, 'application/json'), bodies))
+    return time.time() - start
+
+
+def run_batch(base_url, readings, concurrency, batch_size, ndjson=False):
+    url = f"{base_url}/update_sensor/batch"
+    if ndjson:
+        content_type = 'application/x-ndjson'
+        encode = lambda batch: "\n".join(json.dumps(reading) for reading in batch).encode('utf-8')
+    else:
+        content_type = 'application/json'
+        encode = lambda batch: json.dumps(batch).encode('utf-8')
+    bodies = [encode(readings[i:i + batch_size]) for i in range(0, len(readings), batch_size)]
+
+    before = applied_readings(base_url)
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda body: post(url, body, content_type), bodies))
+    # Requests return once enqueued; time until the writer has applied them
+    if before is not None:
+        while (applied_readings(base_url) or 0) < before + len(readings):
+            time.sleep(0.01)
+    return time.time() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare single and batched sensor ingestion throughput")
+    parser.add_argument("--url", default="http://localhost:5050", help="Base URL of the sensor server")
+    parser.add_argument("--readings", type=int, default=5000)
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ndjson", action="store_true", help="Send batches as newline-delimited JSON")
+    parser.add_argument("--skip-single", action="store_true", help="Only run the batched endpoint")
+    args = parser.parse_args()
+
+    readings = make_readings(args.readings, args.devices)
+    base_url = args.url.rstrip('/')
+
+    if not args.skip_single:
+        elapsed = run_single(base_url, readings, args.concurrency)
+        print(f"single: {len(readings)} readings in {elapsed:.2f}s, {len(readings) / elapsed:,.0f} readings/sec")
+
+    elapsed = run_batch(base_url, readings, args.concurrency, args.batch_size, args.ndjson)
+    print(f"batch ({args.batch_size}/request): {len(readings)} readings in {elapsed:.2f}s, "
+          f"{len(readings) / elapsed:,.0f} readings/sec")
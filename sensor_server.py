@@ -1,7 +1,14 @@
 from flask import Flask, request, jsonify
+from sensor_ingest import SensorIngest, parse_readings
+from time_series import TimeSeries
 
 app = Flask(__name__)
 
+ingest = SensorIngest(
+    TimeSeries("temperature"),
+    on_latest=lambda device, ts, temp: print(f"✅ Latest temperature from {device}: {temp}°C")
+)
+
 @app.route('/update_sensor', methods=['POST'])  # Accept only POST
 def update_sensor():
     try:
@@ -23,5 +30,26 @@ def update_sensor():
         print(f"❌ Error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/update_sensor/batch', methods=['POST'])  # JSON array or NDJSON
+def update_sensor_batch():
+    try:
+        readings = parse_readings(request.get_data(), request.content_type)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid JSON: {e}"}), 400
+
+    accepted, errors, queued = ingest.submit(readings)
+    if not queued:
+        return jsonify({"error": "Ingestion queue is full, retry later"}), 503
+    return jsonify({
+        "status": "accepted",
+        "accepted": accepted,
+        "rejected": [{"index": index, "error": error} for index, error in errors[:100]],
+        "rejected_count": len(errors)
+    }), 202
+
+@app.route('/update_sensor/stats')
+def update_sensor_stats():
+    return jsonify(ingest.stats())
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5050, debug=True)
@@ -0,0 +1,57 @@
+import os
+
+import aiml
+import pytest
+
+from kernel_pool import KernelPool, SessionTable, respond_in_session
+
+
+def test_least_recently_used_sessions_are_evicted():
+    sessions = SessionTable(max_sessions=2, ttl=0)
+    assert sessions.touch("a", now=0) == []
+    assert sessions.touch("b", now=1) == []
+    assert sessions.touch("a", now=2) == []
+    assert sessions.touch("c", now=3) == ["b"]
+    assert len(sessions) == 2
+
+
+def test_idle_sessions_expire():
+    sessions = SessionTable(max_sessions=10, ttl=60)
+    sessions.touch("a", now=0)
+    sessions.touch("b", now=50)
+    assert sessions.touch("c", now=100) == ["a"]
+    assert sessions.touch("c", now=1000) == ["b"]
+
+
+def test_evicted_sessions_are_deleted_from_the_kernel():
+    kernel = aiml.Kernel()
+    kernel.verbose(False)
+    sessions = SessionTable(max_sessions=1)
+
+    respond_in_session(kernel, "hello", "a", {"name": "Ann"}, sessions=sessions)
+    respond_in_session(kernel, "hello", "b", sessions=sessions)
+    respond_in_session(kernel, "hello", "_global", sessions=sessions)
+
+    assert "a" not in kernel.getSessionData()
+    assert "b" in kernel.getSessionData()
+    assert "_global" in kernel.getSessionData()
+
+
+class CrashingKernel(aiml.Kernel):
+    def respond(self, text, sessionID="_global"):
+        if text == "crash":
+            os._exit(3)
+        return "alive"
+
+
+def test_dead_workers_are_restarted():
+    kernel = CrashingKernel()
+    kernel.verbose(False)
+    pool = KernelPool(kernel, 1)
+    try:
+        with pytest.raises(RuntimeError):
+            pool.respond("crash", "a")
+        assert pool.respond("hello", "a") == "alive"
+        assert pool.restarts == 1
+    finally:
+        pool.close()
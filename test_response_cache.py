@@ -0,0 +1,39 @@
+import aiml
+
+from response_cache import ResponseCache
+
+THAT_AIML = """<?xml version="1.0" encoding="UTF-8"?>
+<aiml version="1.0">
+<category><pattern>ASK ME</pattern><template>What is it</template></category>
+<category><pattern>WHAT IS IT</pattern><template>Something.</template></category>
+<category>
+    <pattern>WHAT IS IT</pattern><that>WHAT IS IT</that>
+    <template>It.</template>
+</category>
+</aiml>
+"""
+
+
+def make_kernel(tmp_path):
+    path = tmp_path / "that.aiml"
+    path.write_text(THAT_AIML, encoding="utf-8")
+    kernel = aiml.Kernel()
+    kernel.verbose(False)
+    kernel.learn(str(path))
+    return kernel
+
+
+def test_that_dependent_categories_are_cached_separately(tmp_path):
+    kernel = make_kernel(tmp_path)
+    cache = ResponseCache()
+
+    assert cache.respond(kernel, "what is it", "s1") == "Something."
+    assert cache.respond(kernel, "what is it", "s1") == "Something."
+    assert cache.stats()['hits'] == 1
+
+    # After the bot asked "What is it", the <that> category must answer
+    assert cache.respond(kernel, "ask me", "s1") == "What is it"
+    assert cache.respond(kernel, "what is it", "s1") == "It."
+
+    # And a cached "It." must not leak into a session without that context
+    assert cache.respond(kernel, "what is it", "s2") == "Something."
@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+HOUR = 3600
+
+
+def _bucket(start, value):
+    return {'start': start, 'count': 1, 'sum': value, 'min': value, 'max': value,
+            'first': value, 'last': value, 'first_ts': start, 'last_ts': start}
+
+
+def _merge(bucket, other):
+    """Fold another bucket (or reading bucket) into bucket, in any order"""
+    bucket['count'] += other['count']
+    bucket['sum'] += other['sum']
+    bucket['min'] = min(bucket['min'], other['min'])
+    bucket['max'] = max(bucket['max'], other['max'])
+    # Buckets persisted before first_ts/last_ts were kept are ordered by start
+    if other.get('first_ts', other['start']) < bucket.get('first_ts', bucket['start']):
+        bucket['first'] = other['first']
+        bucket['first_ts'] = other.get('first_ts', other['start'])
+    if other.get('last_ts', other['start']) >= bucket.get('last_ts', bucket['start']):
+        bucket['last'] = other['last']
+        bucket['last_ts'] = other.get('last_ts', other['start'])
+
+
+class TimeSeries:
+    """Bounded in-process time series with raw, 1-minute and 1-hour tiers.
+
+    Every reading is kept in the raw tier and folded into the current minute
+    and hour buckets as it arrives, so a window summary reads at most a few
+    hundred precomputed buckets whatever the sampling rate. Late readings
+    are folded into their own bucket while the tier still covers it and
+    counted in dropped otherwise. Each tier is a fixed-size deque, which caps
+    memory. Closed minute buckets are appended to a JSON lines file in
+    batches and reloaded on start.
+    """
+
+    def __init__(self, name, raw_size=3600, minute_size=24 * 60, hour_size=30 * 24,
+                 path=None, persist_batch=10):
+        """
+        Args:
+            name: Series name, e.g. "temperature"
+            raw_size: Number of raw readings kept
+            minute_size: Number of 1-minute buckets kept (default one day)
+            hour_size: Number of 1-hour buckets kept (default 30 days)
+            path: Optional JSON lines file that minute buckets are persisted to
+            persist_batch: Closed minute buckets written per file append
+        """
+        self.name = name
+        self.path = path
+        self.persist_batch = persist_batch
+        self.raw = deque(maxlen=raw_size)
+        self.minutes = deque(maxlen=minute_size)
+        self.hours = deque(maxlen=hour_size)
+        self._pending = []
+        self._latest = None
+        self.late = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def add(self, value, timestamp=None):
+        """Record a reading; timestamp is epoch seconds, defaults to now"""
+        timestamp = time.time() if timestamp is None else timestamp
+        value = float(value)
+        reading = _bucket(timestamp, value)
+        with self._lock:
+            self.raw.append((timestamp, value))
+            if self._latest is None or timestamp >= self._latest[0]:
+                self._latest = (timestamp, value)
+            for tier, size in ((self.minutes, MINUTE), (self.hours, HOUR)):
+                start = timestamp - timestamp % size
+                if tier and tier[-1]['start'] == start:
+                    _merge(tier[-1], reading)
+                elif not tier or tier[-1]['start'] < start:
+                    if tier is self.minutes and tier:
+                        self._closed(tier[-1])
+                    tier.append(dict(reading, start=start))
+                else:
+                    self._add_late(tier, size, start, reading)
+
+    def _add_late(self, tier, size, start, reading):
+        """Fold a reading older than the current bucket into its own bucket,
+        as long as the tier still covers that time"""
+        if start <= tier[-1]['start'] - tier.maxlen * size:
+            self.dropped += 1
+            return
+        self.late += 1
+        index = len(tier)
+        while index > 0 and tier[index - 1]['start'] > start:
+            index -= 1
+        if index > 0 and tier[index - 1]['start'] == start:
+            bucket = tier[index - 1]
+            _merge(bucket, reading)
+        else:
+            if len(tier) == tier.maxlen:
+                tier.popleft()
+                index -= 1
+            bucket = dict(reading, start=start)
+            tier.insert(index, bucket)
+        if tier is self.minutes:
+            # Persisted again; the last copy of a bucket wins on load
+            self._closed(bucket)
+
+    def latest(self):
+        """Return (timestamp, value) of the newest reading, or None"""
+        with self._lock:
+            return self._latest
+
+    def summary(self, window, now=None):
+        """Aggregate the readings of the last window seconds.
+
+        Windows up to two hours are answered from the minute tier, longer
+        ones from the hour tier; the oldest bucket may extend slightly
+        before the window.
+
+        Returns:
+            Dictionary with count, min, max, avg, first, last and trend
+            (last - first), or None if there are no readings in the window
+        """
+        now = time.time() if now is None else now
+        since = now - window
+        with self._lock:
+            if window <= MINUTE:
+                buckets = [_bucket(ts, value) for ts, value in reversed(self.raw) if ts >= since]
+                buckets.reverse()
+            else:
+                tier, size = (self.minutes, MINUTE) if window <= 2 * HOUR else (self.hours, HOUR)
+                buckets = []
+                for bucket in reversed(tier):
+                    if bucket['start'] + size <= since:
+                        break
+                    buckets.append(bucket)
+                buckets.reverse()
+
+        if not buckets:
+            return None
+        total = dict(buckets[0])
+        for bucket in buckets[1:]:
+            _merge(total, bucket)
+        return {
+            'count': total['count'],
+            'min': total['min'],
+            'max': total['max'],
+            'avg': total['sum'] / total['count'],
+            'first': total['first'],
+            'last': total['last'],
+            'trend': total['last'] - total['first']
+        }
+
+    def _closed(self, bucket):
+        if not self.path:
+            return
+        self._pending.append(dict(bucket))
+        if len(self._pending) >= self.persist_batch:
+            self._write_pending()
+
+    def _write_pending(self):
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for bucket in self._pending:
+                    f.write(json.dumps(bucket) + "\n")
+            self._pending = []
+        except OSError as e:
+            logger.error(f"Failed to persist {self.name} series: {e}")
+
+    def _load(self):
+        """Rebuild the minute and hour tiers from persisted minute buckets"""
+        if not os.path.exists(self.path):
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = deque(f, maxlen=self.hours.maxlen * 60)
+        # A bucket flushed on shutdown is written again once it closes
+        buckets = {}
+        for line in lines:
+            try:
+                bucket = json.loads(line)
+            except ValueError:
+                continue
+            buckets[bucket['start']] = bucket
+        for start in sorted(buckets):
+            bucket = buckets[start]
+            self.minutes.append(bucket)
+            hour = start - start % HOUR
+            if self.hours and self.hours[-1]['start'] == hour:
+                _merge(self.hours[-1], bucket)
+            else:
+                self.hours.append(dict(bucket, start=hour))
+        logger.info(f"Loaded {len(buckets)} {self.name} minute buckets from {self.path}")
+
+    def flush(self):
+        """Persist closed and current minute buckets.
+
+        The current bucket is written as is, so call this on shutdown only.
+        """
+        with self._lock:
+            if self.path:
+                if self.minutes:
+                    self._pending.append(dict(self.minutes[-1]))
+                self._write_pending()